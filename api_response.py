@@ -0,0 +1,65 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used when it is not bundled
+    orjson = None
+
+# Header maps shared by every response, built once and read-only. Each response gets its
+# own plain-dict copy because the Lambda runtime can only serialize real dicts.
+JSON_HEADERS = MappingProxyType({
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',  # Enable CORS
+})
+
+POST_CORS_HEADERS = MappingProxyType({
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'OPTIONS,POST'
+})
+
+AUTH_POST_CORS_HEADERS = MappingProxyType({
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS'
+})
+
+DIET_CORS_HEADERS = MappingProxyType({
+    'Access-Control-Allow-Origin': '*',  # Change this to your frontend domain in production
+    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+    'Access-Control-Allow-Headers': 'Content-Type'
+})
+
+def _default(obj):
+    """Encode the non-JSON types DynamoDB and our handlers produce, without copying the structure first."""
+    if isinstance(obj, Decimal):
+        return float(obj) if obj % 1 else int(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def encode(obj):
+        """Serialize to a JSON string in a single pass (orjson backend)."""
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+else:
+    def encode(obj):
+        """Serialize to a JSON string in a single pass (stdlib backend)."""
+        return json.dumps(obj, default=_default)
+
+def raw_response(status_code, body, headers=JSON_HEADERS):
+    """Build a Lambda proxy response around an already-encoded body."""
+    return {
+        'statusCode': status_code,
+        'headers': dict(headers),
+        'body': body
+    }
+
+def json_response(status_code, payload, headers=JSON_HEADERS):
+    """Build a Lambda proxy response, encoding `payload` as JSON."""
+    return raw_response(status_code, encode(payload), headers)
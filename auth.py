@@ -0,0 +1,124 @@
+"""Session tokens and failed-login lockout for POST /login.
+
+A successful login returns a signed, short-lived JWT (HS256, secret from
+JWT_SECRET), so the endpoint issues a credential instead of only answering
+yes or no.
+
+Failed logins are counted per email address in LOGIN_ATTEMPTS_TABLE, whether or
+not the address is registered, so lockouts do not reveal which emails have
+accounts. After MAX_FAILED_LOGINS failures within FAILURE_WINDOW_SECONDS the
+address is locked for LOCKOUT_SECONDS. A successful login clears the count.
+Failures are counted with conditional UpdateItem calls, so concurrent bad
+logins cannot overwrite each other's count. Records expire through the
+table's TTL on `expires_at`.
+"""
+import os
+import time
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+import jwt
+
+import aws_clients
+import structured_log
+
+log = structured_log.get_logger(__name__)
+
+# Signing secret for session tokens; logins fail closed without it
+JWT_SECRET = os.environ.get('JWT_SECRET')
+JWT_ISSUER = os.environ.get('JWT_ISSUER', 'dyadic-health')
+JWT_ALGORITHM = 'HS256'
+SESSION_TOKEN_SECONDS = int(os.environ.get('SESSION_TOKEN_SECONDS', '3600'))
+
+# Table keyed by `email`, with TTL enabled on `expires_at`
+LOGIN_ATTEMPTS_TABLE = os.environ.get('LOGIN_ATTEMPTS_TABLE', 'login_attempts')
+MAX_FAILED_LOGINS = int(os.environ.get('MAX_FAILED_LOGINS', '5'))
+FAILURE_WINDOW_SECONDS = 15 * 60
+LOCKOUT_SECONDS = int(os.environ.get('LOGIN_LOCKOUT_SECONDS', str(15 * 60)))
+
+def normalize_email(email):
+    return email.strip().lower()
+
+# =======================|| Session tokens ||========================
+
+def issue_token(email, now=None):
+    """Return (token, expires_in_seconds) for an authenticated user."""
+    if not JWT_SECRET:
+        raise RuntimeError('JWT_SECRET is not configured')
+    now = int(now if now is not None else time.time())
+    claims = {
+        'sub': normalize_email(email),
+        'iss': JWT_ISSUER,
+        'iat': now,
+        'exp': now + SESSION_TOKEN_SECONDS
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM), SESSION_TOKEN_SECONDS
+
+# =======================|| Lockout ||========================
+
+def login_attempts(email):
+    """Failed-login record for an address ({} if there is none)."""
+    table = aws_clients.get_table(LOGIN_ATTEMPTS_TABLE)
+    return table.get_item(Key={'email': normalize_email(email)}, ConsistentRead=True).get('Item') or {}
+
+def is_locked_out(record, now=None):
+    """True while the address is locked after too many failed logins."""
+    now = int(now if now is not None else time.time())
+    return int(record.get('locked_until', 0)) > now
+
+def _is_condition_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+def _count_failure(table, key, now, expires_at):
+    """Add one failure to the address's current window, or open a new window. Returns the new count."""
+    window_floor = now - FAILURE_WINDOW_SECONDS
+    while True:
+        try:
+            # Inside the window: increment atomically and read back the result
+            response = table.update_item(
+                Key=key,
+                UpdateExpression='ADD failures :one SET expires_at = :expires',
+                ConditionExpression=Attr('window_started').gt(window_floor),
+                ExpressionAttributeValues={':one': 1, ':expires': expires_at},
+                ReturnValues='UPDATED_NEW'
+            )
+            return int(response['Attributes']['failures'])
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+        try:
+            # No record or an expired window: start a new one, unless a concurrent failure just did
+            table.update_item(
+                Key=key,
+                UpdateExpression='SET failures = :one, window_started = :now, expires_at = :expires',
+                ConditionExpression=Attr('window_started').not_exists() | Attr('window_started').lte(window_floor),
+                ExpressionAttributeValues={':one': 1, ':now': now, ':expires': expires_at}
+            )
+            return 1
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+
+def record_failure(email, now=None):
+    """Count a failed login; locks the address once MAX_FAILED_LOGINS is reached. Returns True if now locked."""
+    now = int(now if now is not None else time.time())
+    table = aws_clients.get_table(LOGIN_ATTEMPTS_TABLE)
+    key = {'email': normalize_email(email)}
+    expires_at = now + max(FAILURE_WINDOW_SECONDS, LOCKOUT_SECONDS)
+    failures = _count_failure(table, key, now, expires_at)
+    if failures < MAX_FAILED_LOGINS:
+        return False
+    table.update_item(
+        Key=key,
+        UpdateExpression='SET locked_until = :until, expires_at = :expires',
+        ExpressionAttributeValues={':until': now + LOCKOUT_SECONDS, ':expires': now + LOCKOUT_SECONDS + FAILURE_WINDOW_SECONDS}
+    )
+    return True
+
+def clear_failures(email):
+    """Forget failed logins after a successful one."""
+    try:
+        aws_clients.get_table(LOGIN_ATTEMPTS_TABLE).delete_item(Key={'email': normalize_email(email)})
+    except ClientError as e:
+        # A stale count only matters if the user fails again within the window
+        log.warning("Error clearing failed logins: %s", e)
@@ -0,0 +1,80 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+import metrics
+
+# Connection settings shared by every client in the container
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '10'))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '5'))
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    tcp_keepalive=True,  # Keep idle connections alive between warm invocations
+    retries={'max_attempts': 3, 'mode': 'standard'}
+)
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+def get_session():
+    """Return the per-process boto3 session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = boto3.session.Session()
+                # Time every AWS call made by clients created from this session
+                metrics.instrument_session(session)
+                _session = session
+    return _session
+
+def get_client(service_name, region_name=None):
+    """Return a shared low-level client, creating it the first time it is asked for."""
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = get_session().client(service_name, region_name=region_name, config=CLIENT_CONFIG)
+                _clients[key] = client
+    return client
+
+def get_resource(service_name, region_name=None):
+    """Return a shared resource object, creating it the first time it is asked for."""
+    key = (service_name, region_name)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = get_session().resource(service_name, region_name=region_name, config=CLIENT_CONFIG)
+                _resources[key] = resource
+    return resource
+
+def get_table(table_name, region_name=None):
+    """Return a shared DynamoDB Table object."""
+    key = (table_name, region_name)
+    table = _tables.get(key)
+    if table is None:
+        table = get_resource('dynamodb', region_name).Table(table_name)
+        _tables[key] = table
+    return table
+
+def reset():
+    """Forget every cached session, client and table (used by local tools and benchmarks)."""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
@@ -0,0 +1,274 @@
+"""Render wellness report PDFs for many users in parallel (nightly runs).
+
+reportlab renders in pure Python on a single core, so requests are split into
+shards and the shards are spread over a process pool sized to the CPUs this
+process may use. Each worker registers fonts and builds styles once, when it
+starts, and writes its PDFs straight to the output directory or S3. PDFs never
+travel back to the parent, which only receives per-document timings. Memory
+stays bounded because at most --max-in-flight shards are queued at a time.
+
+Input is JSONL (a local path or s3://bucket/key). Each line is a pdf_report
+request plus a `userId`, which names the output file and so may only use
+letters, digits, '.', '_' and '-', e.g.
+    {"userId": "u1", "name": "Sam", "recovery": {"sleep": 7}, "diet": {...}, "postureIds": [...]}
+
+Lambda has no /dev/shm, so process pools cannot start there. Run this as a
+container task or on an instance. If the pool cannot be created, rendering
+falls back to the current process.
+
+Usage:
+    python batch_pdf.py users.jsonl --output-dir out/
+    python batch_pdf.py s3://bucket/nightly/users.jsonl --s3-prefix nightly/2024-06-01/ --timings timings.jsonl
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import aws_clients
+from stats import percentile
+
+REPORTS_BUCKET = os.environ.get('REPORTS_BUCKET', 'dyadic-wellness-reports')
+DEFAULT_SHARD_SIZE = 25
+
+# userId becomes a file name or S3 key, so it may not contain path separators or start with a dot
+_USER_ID_RE = re.compile(r'[A-Za-z0-9_-][A-Za-z0-9_.-]{0,127}')
+
+# Rendered once per worker so the first real document is not the one paying for warm-up
+WARMUP_REQUEST = {'name': 'Warm-up', 'recovery': {'sleep': 8, 'workoutRecovery': 30, 'relaxation': 20}}
+
+def available_cpus():
+    """CPUs this process may run on (respects affinity and container CPU sets)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# =======================|| Output ||========================
+
+def check_user_id(user_id):
+    """Return `user_id` if it is safe to use as a file name; raises ValueError otherwise."""
+    if not isinstance(user_id, str) or not _USER_ID_RE.fullmatch(user_id):
+        raise ValueError(f"Invalid userId {user_id!r}: use letters, digits, '.', '_' or '-'")
+    return user_id
+
+class DirectorySink:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, user_id, buffer):
+        location = os.path.join(self.path, f"{user_id}.pdf")
+        with open(location, 'wb') as pdf_file:
+            pdf_file.write(buffer.getbuffer())
+        return location
+
+class S3Sink:
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def write(self, user_id, buffer):
+        key = f"{self.prefix}{user_id}.pdf"
+        buffer.seek(0)
+        aws_clients.get_client('s3').upload_fileobj(
+            buffer, self.bucket, key, ExtraArgs={'ContentType': 'application/pdf'}
+        )
+        return f"s3://{self.bucket}/{key}"
+
+def make_sink(spec):
+    """Build a sink from a picklable spec: ('dir', path) or ('s3', bucket, prefix)."""
+    kind, *args = spec
+    return DirectorySink(*args) if kind == 'dir' else S3Sink(*args)
+
+# =======================|| Worker ||========================
+
+_worker = {}
+
+def init_worker(sink_spec):
+    """Per-process setup: fresh AWS clients, fonts and styles, one warm-up render."""
+    aws_clients.reset()
+    import pdf_report  # registers fonts and builds styles on import
+
+    pdf_report.render_pdf(WARMUP_REQUEST)
+    _worker['render'] = pdf_report.render_pdf
+    _worker['sink'] = make_sink(sink_spec)
+
+def render_shard(requests):
+    """Render and write every request in a shard; returns one timing record per document."""
+    render, sink = _worker['render'], _worker['sink']
+    results = []
+    for request in requests:
+        result = {'userId': request['userId'], 'worker': os.getpid()}
+        try:
+            if 'parseError' in request:
+                raise ValueError(request['parseError'])
+            check_user_id(request['userId'])
+            start = time.perf_counter()
+            buffer = render(request, io.BytesIO())
+            rendered = time.perf_counter()
+            result['location'] = sink.write(request['userId'], buffer)
+            result['bytes'] = len(buffer.getbuffer())
+            result['render_ms'] = (rendered - start) * 1000
+            result['write_ms'] = (time.perf_counter() - rendered) * 1000
+        except Exception as e:
+            result['error'] = str(e)
+        results.append(result)
+    return results
+
+# =======================|| Driver ||========================
+
+def parse_requests(lines):
+    """Yield one request per non-blank line; a malformed line becomes a request carrying its parseError."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            request = {'parseError': f"Line {number} is not valid JSON: {e}"}
+        if not isinstance(request, dict):
+            request = {'parseError': f"Line {number} is not a JSON object"}
+        request.setdefault('userId', f"line-{number}")
+        yield request
+
+def iter_requests(source):
+    """Yield report requests from a JSONL file or s3://bucket/key, one line at a time."""
+    if source.startswith('s3://'):
+        bucket, _, key = source[len('s3://'):].partition('/')
+        body = aws_clients.get_client('s3').get_object(Bucket=bucket, Key=key)['Body']
+        yield from parse_requests(line.decode('utf-8') for line in body.iter_lines())
+    else:
+        with open(source, encoding='utf-8') as requests_file:
+            yield from parse_requests(requests_file)
+
+def iter_shards(requests, shard_size):
+    shard = []
+    for request in requests:
+        shard.append(request)
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+class Summary:
+    def __init__(self):
+        self.documents = 0
+        self.errors = 0
+        self.bytes = 0
+        self.render_ms = []
+        self.started = time.perf_counter()
+
+    def add(self, result):
+        self.documents += 1
+        if 'error' in result:
+            self.errors += 1
+        else:
+            self.bytes += result['bytes']
+            self.render_ms.append(result['render_ms'])
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        timings = sorted(self.render_ms)
+        return {
+            'documents': self.documents,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 3),
+            'documents_per_s': round(self.documents / elapsed, 1) if elapsed else 0.0,
+            'render_p50_ms': round(percentile(timings, 50), 2),
+            'render_p95_ms': round(percentile(timings, 95), 2),
+            'render_max_ms': round(timings[-1], 2) if timings else 0.0,
+            'megabytes_written': round(self.bytes / 1e6, 2)
+        }
+
+def _run_in_process(shards, sink_spec, handle):
+    init_worker(sink_spec)
+    for shard in shards:
+        handle(render_shard(shard))
+
+def run(requests, sink_spec, workers=None, shard_size=DEFAULT_SHARD_SIZE, max_in_flight=None, on_result=None):
+    """Render every request and return a summary dict; `on_result` sees each document's timing record."""
+    workers = workers or available_cpus()
+    max_in_flight = max_in_flight or workers * 2
+    summary = Summary()
+
+    def handle(results):
+        for result in results:
+            summary.add(result)
+            if on_result:
+                on_result(result)
+
+    shards = iter_shards(requests, shard_size)
+    if workers == 1:
+        _run_in_process(shards, sink_spec, handle)
+        return summary.as_dict()
+
+    try:
+        # spawn rather than fork: the parent may already hold boto3 connection pools and threads
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(sink_spec,)
+        )
+    except OSError as e:
+        print(f"Process pool unavailable ({e}); rendering in this process", file=sys.stderr)
+        _run_in_process(shards, sink_spec, handle)
+        return summary.as_dict()
+
+    with pool:
+        pending = set()
+        for shard in shards:
+            pending.add(pool.submit(render_shard, shard))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future.result())
+        for future in wait(pending).done:
+            handle(future.result())
+    return summary.as_dict()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='JSONL of report requests (path or s3://bucket/key)')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--output-dir', help='write PDFs to this directory')
+    output.add_argument('--s3-prefix', help='upload PDFs under this key prefix in --bucket')
+    parser.add_argument('--bucket', default=REPORTS_BUCKET)
+    parser.add_argument('--workers', type=int, help=f'worker processes (default: {available_cpus()}, the usable CPUs)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='documents per task')
+    parser.add_argument('--max-in-flight', type=int, help='shards queued at once (default: 2 per worker)')
+    parser.add_argument('--timings', help='write one JSON line per document to this file')
+    args = parser.parse_args(argv)
+
+    sink_spec = ('dir', args.output_dir) if args.output_dir else ('s3', args.bucket, args.s3_prefix)
+    timings_file = open(args.timings, 'w', encoding='utf-8') if args.timings else None
+
+    def on_result(result):
+        if 'error' in result:
+            print(f"Error rendering report for {result['userId']}: {result['error']}", file=sys.stderr)
+        if timings_file:
+            timings_file.write(json.dumps(result) + '\n')
+
+    try:
+        summary = run(
+            iter_requests(args.source), sink_spec,
+            workers=args.workers,
+            shard_size=args.shard_size,
+            max_in_flight=args.max_in_flight,
+            on_result=on_result
+        )
+    finally:
+        if timings_file:
+            timings_file.close()
+
+    print(json.dumps(summary))
+    return 1 if summary['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
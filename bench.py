@@ -0,0 +1,272 @@
+"""Local benchmark for the HTTP handlers in serverless.yml.
+
+Every handler is driven with synthetic API Gateway events (or events
+recorded to a JSONL file) while aws_clients is pointed at the in-memory
+DynamoDB/SES stand-ins from local_aws, optionally with injected latency.
+For each endpoint it reports the cold call (fresh module state, empty
+caches), warm p50/p95/p99 latency and throughput, and peak memory
+allocated per warm call. With --metrics it also lists the warm histograms
+collected by metrics.py (routes and handler phases; the stand-ins bypass
+botocore, so AWS calls only show up against real clients).
+
+Import cost of boto3 and the other vendored packages is not part of the
+cold numbers here because the stand-ins already import them; use
+coldstart_profile.py for that.
+
+Usage:
+    python bench.py                                   # every handler, no injected latency
+    python bench.py --latency-ms 5 --iterations 500
+    python bench.py --handler diet.lambda_handler --op-latency BatchGetItem=8
+    python bench.py --events recorded.jsonl           # lines of {"handler": ..., "event": {...}}
+    python bench.py --json bench.json
+    python bench.py --metrics                         # plus per-route and per-phase p50/p99
+"""
+import argparse
+import csv
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# POST /login signs a session token; POST /register keys its password fingerprint
+os.environ.setdefault('JWT_SECRET', 'bench-only-secret')
+os.environ.setdefault('IDEMPOTENCY_HASH_KEY', 'bench-only-key')
+# Handler INFO records would otherwise be written, and timed, on every iteration
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import coldstart_profile  # noqa: E402
+import credentials  # noqa: E402
+import dyna  # noqa: E402
+import local_aws  # noqa: E402
+import metrics  # noqa: E402
+from stats import percentile  # noqa: E402
+
+QUESTIONS_CSV = os.path.join(ROOT, 'Updated_Relationship_Questions_and_Feedback_with_Second_Person_Narration.csv')
+
+# Modules that keep per-container state and are re-imported for every cold measurement
+_STATEFUL_MODULES = (
+    'router', 'handler', 'newsletter_import', 'outbox', 'email_templates', 'trainques', 'scoring',
+    'posture', 'diet', 'bmi', 'recovery_report', 'fanout', 'ttl_cache', 'credentials',
+    'idempotency', 'wellness_report', 'pdf_report', 'docx_report'
+)
+
+POSTURE_IDS = ('forward-head', 'rounded-shoulders', 'swayback', 'flat-back', 'kyphosis')
+RELATIONSHIP_TYPES = ('Intimate', 'Parental', 'Others')
+
+def _post(path, payload):
+    return {'httpMethod': 'POST', 'path': path, 'headers': {'Content-Type': 'application/json'}, 'body': json.dumps(payload)}
+
+def _sample_answers(count=10):
+    with open(QUESTIONS_CSV, newline='', encoding='utf-8-sig') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    return [
+        {'relationshipType': row['Relationship Type'], 'question': row['Question'], 'rating': int(row['Rating'])}
+        for row in rows[:count]
+    ]
+
+def synthetic_events():
+    """handler -> function(i) returning the i-th synthetic event for it."""
+    rng = random.Random(42)
+    answers = _sample_answers()
+    import_csv = 'email,firstName\n' + ''.join(f'partner{n}@example.com,Partner\n' for n in range(100))
+
+    return {
+        'handler.subscribe_user': lambda i: _post('/subscribe', {'email': f'bench{i}@example.com', 'firstName': 'Bench'}),
+        'handler.register_user': lambda i: _post('/register', {
+            'email': f'bench{i}@example.com', 'firstName': 'Bench', 'lastName': 'User', 'password': 'correct horse'
+        }),
+        'handler.login_user': lambda i: _post('/login', {'email': 'member@example.com', 'password': 'correct horse'}),
+        'newsletter_import.import_subscribers': lambda i: {
+            'httpMethod': 'POST', 'path': '/subscribe/import', 'headers': {'Content-Type': 'text/csv'}, 'body': import_csv,
+            'requestContext': {'identity': {'apiKeyId': 'bench'}}
+        },
+        'trainques.fetch_questions': lambda i: {
+            'httpMethod': 'GET', 'path': '/questions',
+            'queryStringParameters': {'relationshipType': RELATIONSHIP_TYPES[i % len(RELATIONSHIP_TYPES)]}
+        },
+        'scoring.score_answers': lambda i: _post('/questions/score', {'answers': answers}),
+        'posture.lambda_handler': lambda i: {
+            'httpMethod': 'GET', 'path': f'/posture/{POSTURE_IDS[i % len(POSTURE_IDS)]}',
+            'pathParameters': {'postureId': POSTURE_IDS[i % len(POSTURE_IDS)]}
+        },
+        'diet.lambda_handler': lambda i: _post('/diet', {
+            group: rng.randint(0, 6) for group in ('vegetables', 'protein', 'grains', 'nutsSeeds', 'dairy', 'fruits')
+        }),
+        'bmi.lambda_handler': lambda i: _post('/bmi', {'height': rng.uniform(150, 200), 'weight': rng.uniform(45, 120)}),
+        'bmi.lambda_batch_handler': lambda i: _post('/bmi/batch', {
+            'heights': [rng.uniform(150, 200) for _ in range(1000)],
+            'weights': [rng.uniform(45, 120) for _ in range(1000)]
+        }),
+        'recovery_report.lambda_handler': lambda i: _post('/recovery-report', {
+            'sleep': rng.uniform(4, 10), 'workoutRecovery': rng.randint(0, 60), 'relaxation': rng.randint(0, 60)
+        }),
+        'pdf_report.lambda_handler': lambda i: _post('/report/pdf', {
+            'recovery': {'sleep': rng.uniform(4, 10), 'workoutRecovery': rng.randint(0, 60), 'relaxation': rng.randint(0, 60)},
+            'diet': {group: rng.randint(0, 6) for group in ('vegetables', 'protein', 'grains', 'nutsSeeds', 'dairy', 'fruits')},
+            'postureIds': list(POSTURE_IDS)
+        }),
+        'docx_report.lambda_handler': lambda i: _post('/report/docx', {
+            'recovery': {'sleep': rng.uniform(4, 10), 'workoutRecovery': rng.randint(0, 60), 'relaxation': rng.randint(0, 60)},
+            'diet': {group: rng.randint(0, 6) for group in ('vegetables', 'protein', 'grains', 'nutsSeeds', 'dairy', 'fruits')},
+            'postureIds': list(POSTURE_IDS)
+        }),
+        'router.route': lambda i: dict(_post('/api/bmi', {'height': 180, 'weight': 75})),
+    }
+
+def recorded_events(path):
+    """handler -> function(i) cycling through events recorded for it in a JSONL file."""
+    recorded = {}
+    with open(path, encoding='utf-8') as events_file:
+        for line in events_file:
+            if line.strip():
+                entry = json.loads(line)
+                recorded.setdefault(entry['handler'], []).append(entry['event'])
+    return {handler: (lambda i, events=events: events[i % len(events)]) for handler, events in recorded.items()}
+
+def seed(local):
+    """Fill the stand-in tables with the reference data the handlers read."""
+    questions = local.dynamodb.Table('QuestionsTable')
+    with open(QUESTIONS_CSV, newline='', encoding='utf-8-sig') as csvfile:
+        for row in csv.DictReader(csvfile):
+            questions.put_item(Item=dyna.question_item(row))
+
+    diet_table = local.dynamodb.Table('dietreport')
+    for group, category in itertools.product(
+        ('veg', 'protein', 'grains', 'nuts', 'dairy', 'fruits'), ('below', 'at', 'above')
+    ):
+        report_id = f'{group}-{category}'
+        diet_table.put_item(Item={'reportId': report_id, 'recommendation': f'Recommendation for {report_id}.'})
+
+    local.dynamodb.Table('Register_Data').put_item(Item={
+        'email': 'member@example.com', 'firstName': 'Member', 'lastName': 'User',
+        'password': credentials.hash_password('correct horse', credentials.MIN_LN)
+    })
+
+    posture_table = local.dynamodb.Table('posturereport')
+    for posture_id in POSTURE_IDS:
+        posture_table.put_item(Item={'posture_id': posture_id, 'report': f'Posture report for {posture_id}.'})
+
+def _fresh_handler(target):
+    """Re-import a handler with empty module-level state, as a new container would."""
+    for name in _STATEFUL_MODULES:
+        sys.modules.pop(name, None)
+    module_name, function_name = target.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+def bench_handler(target, make_event, iterations, alloc_samples, latency):
+    local = local_aws.install(local_aws.LocalAWS(latency))
+    seed(local)
+    calls_before = sum(latency.calls.values())
+
+    # Cold: module init plus the first call with empty caches
+    start = time.perf_counter()
+    function = _fresh_handler(target)
+    response = function(make_event(0), None)
+    cold_ms = (time.perf_counter() - start) * 1000
+    errors = 0 if 200 <= response.get('statusCode', 500) < 400 else 1
+
+    # Warm
+    metrics.drain()
+    timings = []
+    for i in range(1, iterations + 1):
+        event = make_event(i)
+        start = time.perf_counter()
+        response = function(event, None)
+        timings.append((time.perf_counter() - start) * 1000)
+        if not 200 <= response.get('statusCode', 500) < 400:
+            errors += 1
+    warm_metrics = metrics.drain()
+
+    # Allocations, measured separately because tracing slows calls down
+    peaks = []
+    tracemalloc.start()
+    for i in range(alloc_samples):
+        event = make_event(iterations + i)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        function(event, None)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    metrics.drain()
+
+    timings.sort()
+    return {
+        'handler': target,
+        'cold_ms': cold_ms,
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'throughput_rps': len(timings) / (sum(timings) / 1000) if sum(timings) else 0.0,
+        'peak_alloc_kb': (sum(peaks) / len(peaks) / 1024) if peaks else None,
+        'aws_calls_per_request': (sum(latency.calls.values()) - calls_before) / (iterations + 1 + alloc_samples),
+        'errors': errors,
+        'metrics': metrics.summary(warm_metrics)
+    }
+
+def format_results(results):
+    header = f"{'handler':40} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'alloc KB':>9} {'aws/req':>8} {'errors':>6}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        alloc = f"{r['peak_alloc_kb']:9.1f}" if r['peak_alloc_kb'] is not None else f"{'n/a':>9}"
+        lines.append(
+            f"{r['handler']:40} {r['cold_ms']:9.2f} {r['p50_ms']:8.3f} {r['p95_ms']:8.3f} {r['p99_ms']:8.3f} "
+            f"{r['throughput_rps']:9.0f} {alloc} {r['aws_calls_per_request']:8.2f} {r['errors']:6d}"
+        )
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handler', action='append', help='handler to benchmark (default: every HTTP handler)')
+    parser.add_argument('--events', help='JSONL file of recorded {"handler", "event"} entries to replay')
+    parser.add_argument('--iterations', type=int, default=200, help='warm calls per handler')
+    parser.add_argument('--alloc-samples', type=int, default=20, help='warm calls traced for allocations')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency injected into every AWS call')
+    parser.add_argument('--op-latency', action='append', default=[], metavar='OPERATION=MS',
+                        help='per-operation latency, e.g. Query=8 (repeatable)')
+    parser.add_argument('--json', help='also write results to this JSON file')
+    parser.add_argument('--metrics', action='store_true',
+                        help='also print warm route, phase and AWS call latencies from metrics.py')
+    args = parser.parse_args(argv)
+
+    # Keep metrics in memory instead of writing EMF lines into the report
+    metrics.METRICS_SINK = 'local'
+
+    per_operation = {}
+    for spec in args.op_latency:
+        operation, ms = spec.split('=', 1)
+        per_operation[operation] = float(ms) / 1000
+
+    events = synthetic_events()
+    if args.events:
+        events.update(recorded_events(args.events))
+
+    handlers = args.handler or coldstart_profile.read_handlers()
+    results = []
+    try:
+        for target in handlers:
+            if target not in events:
+                print(f"Skipping {target}: no synthetic or recorded event", file=sys.stderr)
+                continue
+            latency = local_aws.Latency(args.latency_ms / 1000, per_operation)
+            results.append(bench_handler(target, events[target], args.iterations, args.alloc_samples, latency))
+    finally:
+        local_aws.uninstall()
+
+    print(format_results(results))
+    if args.metrics:
+        print()
+        print(metrics.format_summary([row for result in results for row in result['metrics']]))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
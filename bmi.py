@@ -1,8 +1,12 @@
 import json
-import logging
+from bisect import bisect_right
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+import metrics
+import structured_log
+from api_response import POST_CORS_HEADERS, json_response
+from stats import percentile
+
+log = structured_log.get_logger(__name__)
 
 def calculate_bmi(height, weight):
     """
@@ -13,53 +17,111 @@ def calculate_bmi(height, weight):
         bmi_value = weight / (height_in_meters * height_in_meters)
         return round(bmi_value, 2)  # Return BMI rounded to 2 decimal places
     except Exception as e:
-        logging.error(f"Error calculating BMI: {str(e)}")
+        log.error("Error calculating BMI: %s", e)
         return None
 
+# BMI categories in threshold order: (category, message, points)
+BMI_CATEGORIES = (
+    ("underweight", "You are underweight. You might need to increase your calorie intake to reach a healthier weight.", 1),
+    ("normal", "You are in the normal BMI range. Keep up the good work maintaining a balanced diet and regular exercise.", 2),
+    ("overweight", "You are overweight. Incorporating more physical activity and a balanced diet can help reach a healthier weight.", 3),
+    ("obese", "You are in the obese range. It might be beneficial to consult with a healthcare provider for personalized advice.", 4),
+)
+
+# Percentiles reported for a cohort
+COHORT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Largest cohort accepted by a single batch request
+MAX_BATCH_SIZE = 100000
+
+# Lower bounds of normal, overweight and obese; each category is the half-open range [bound, next bound)
+BMI_THRESHOLDS = (18.5, 25, 30)
+
+def get_bmi_category_index(bmi):
+    """Index into BMI_CATEGORIES for a BMI value."""
+    return bisect_right(BMI_THRESHOLDS, bmi)
+
 def get_bmi_category(bmi):
     """
     Function to categorize BMI into points and health ranges.
     """
-    if bmi < 18.5:
-        return {
-            "bmi": bmi,
-            "category": "underweight",
-            "message": "You are underweight. You might need to increase your calorie intake to reach a healthier weight.",
-            "points": 1  # Point assignment for underweight
-        }
-    elif 18.5 <= bmi < 24.9:
-        return {
-            "bmi": bmi,
-            "category": "normal",
-            "message": "You are in the normal BMI range. Keep up the good work maintaining a balanced diet and regular exercise.",
-            "points": 2  # Point assignment for normal BMI
-        }
-    elif 25 <= bmi < 29.9:
-        return {
-            "bmi": bmi,
-            "category": "overweight",
-            "message": "You are overweight. Incorporating more physical activity and a balanced diet can help reach a healthier weight.",
-            "points": 3  # Point assignment for overweight
-        }
-    else:
-        return {
-            "bmi": bmi,
-            "category": "obese",
-            "message": "You are in the obese range. It might be beneficial to consult with a healthcare provider for personalized advice.",
-            "points": 4  # Point assignment for obese
-        }
+    category, message, points = BMI_CATEGORIES[get_bmi_category_index(bmi)]
+    return {
+        "bmi": bmi,
+        "category": category,
+        "message": message,
+        "points": points
+    }
+
+def _to_positive_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 and value == value and value != float('inf') else None
+
+def _batch_bmi(height, weight):
+    """Rounded BMI for one validated pair, or None if it is not a finite number."""
+    height_in_meters = height / 100
+    height_squared = height_in_meters * height_in_meters
+    # A tiny height squares to 0 and a huge weight overflows; both are invalid input
+    if not height_squared > 0:
+        return None
+    bmi_value = weight / height_squared
+    return round(bmi_value, 2) if bmi_value != float('inf') else None
+
+def calculate_bmi_batch(heights, weights):
+    """
+    BMI for a cohort in one pass. Returns (bmis, category_indexes) with None for invalid pairs.
+    Values and categories always match calculate_bmi and get_bmi_category_index.
+    """
+    bmis = []
+    indexes = []
+    for height, weight in zip(heights, weights):
+        height = _to_positive_float(height)
+        weight = _to_positive_float(weight)
+        bmi = _batch_bmi(height, weight) if height is not None and weight is not None else None
+        bmis.append(bmi)
+        indexes.append(get_bmi_category_index(bmi) if bmi is not None else None)
+    return bmis, indexes
 
+def cohort_report(heights, weights):
+    """Columnar BMI results for a cohort plus percentiles and a category histogram."""
+    bmis, indexes = calculate_bmi_batch(heights, weights)
+    names = [c[0] for c in BMI_CATEGORIES]
+    valid_bmis = sorted(b for b in bmis if b is not None)
+
+    histogram = dict.fromkeys(names, 0)
+    for index in indexes:
+        if index is not None:
+            histogram[names[index]] += 1
+
+    stats = {"count": len(valid_bmis), "invalid": len(bmis) - len(valid_bmis), "histogram": histogram}
+    if valid_bmis:
+        stats["mean"] = round(sum(valid_bmis) / len(valid_bmis), 2)
+        stats["percentiles"] = {f"p{p}": round(percentile(valid_bmis, p), 2) for p in COHORT_PERCENTILES}
+
+    return {
+        "bmi": bmis,
+        "category": [names[i] if i is not None else None for i in indexes],
+        "points": [BMI_CATEGORIES[i][2] if i is not None else None for i in indexes],
+        "categories": {name: {"message": message, "points": points} for name, message, points in BMI_CATEGORIES},
+        "stats": stats
+    }
+
+@metrics.timed('POST /bmi')
 def lambda_handler(event, context):
     """
     Lambda function handler to process the event and calculate BMI.
     Expects a POST request with `height` and `weight` in the body.
     """
-    logging.debug("Received event: %s", json.dumps(event))
+    # Serialized only when DEBUG is enabled and this invocation is sampled
+    log.debug("Received event", event=event)
 
     try:
         # Parse request body
         body = json.loads(event['body'])
-        logging.debug("Parsed body: %s", json.dumps(body))
+        log.debug("Parsed body", body=body)
 
         # Extract height and weight from the request body
         height = body.get('height')
@@ -67,16 +129,8 @@ def lambda_handler(event, context):
 
         # Validate that both height and weight are provided
         if None in (height, weight):
-            logging.error("Validation failed: missing height or weight")
-            return {
-                "statusCode": 400,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,POST"
-                },
-                "body": json.dumps({"error": "Invalid input: height and weight are required"})
-            }
+            log.warning("Validation failed: missing height or weight")
+            return json_response(400, {"error": "Invalid input: height and weight are required"}, POST_CORS_HEADERS)
 
         # Convert height and weight to float for calculation
         height = float(height)
@@ -85,37 +139,36 @@ def lambda_handler(event, context):
         # Calculate BMI
         bmi = calculate_bmi(height, weight)
         if bmi is None:
-            return {
-                "statusCode": 500,
-                "headers": {
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "Content-Type",
-                    "Access-Control-Allow-Methods": "OPTIONS,POST"
-                },
-                "body": json.dumps({"error": "Failed to calculate BMI"})
-            }
+            return json_response(500, {"error": "Failed to calculate BMI"}, POST_CORS_HEADERS)
 
         # Get BMI category and points
         bmi_result = get_bmi_category(bmi)
 
         # Return the BMI, category, message, and points as a response
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST"
-            },
-            "body": json.dumps(bmi_result)
-        }
+        return json_response(200, bmi_result, POST_CORS_HEADERS)
+    except Exception as e:
+        log.exception("Exception: %s", e)
+        return json_response(500, {"error": "Internal server error: " + str(e)}, POST_CORS_HEADERS)
+
+@metrics.timed('POST /bmi/batch')
+def lambda_batch_handler(event, context):
+    """
+    Lambda function handler for cohort BMI.
+    Expects a POST request with equal-length `heights` and `weights` arrays in the body.
+    """
+    try:
+        body = json.loads(event['body'])
+        heights = body.get('heights')
+        weights = body.get('weights')
+
+        if not isinstance(heights, list) or not isinstance(weights, list) or len(heights) != len(weights):
+            log.warning("Validation failed: heights and weights must be arrays of equal length")
+            return json_response(400, {"error": "Invalid input: heights and weights must be arrays of equal length"}, POST_CORS_HEADERS)
+
+        if len(heights) > MAX_BATCH_SIZE:
+            return json_response(400, {"error": f"Invalid input: at most {MAX_BATCH_SIZE} measurements per request"}, POST_CORS_HEADERS)
+
+        return json_response(200, cohort_report(heights, weights), POST_CORS_HEADERS)
     except Exception as e:
-        logging.error("Exception: %s", str(e))
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type",
-                "Access-Control-Allow-Methods": "OPTIONS,POST"
-            },
-            "body": json.dumps({"error": "Internal server error: " + str(e)})
-        }
+        log.exception("Exception: %s", e)
+        return json_response(500, {"error": "Internal server error: " + str(e)}, POST_CORS_HEADERS)
@@ -0,0 +1,168 @@
+"""Cold-start profiler for the handlers declared in serverless.yml.
+
+Each handler is imported in a fresh interpreter (so every run is a cold
+start) with `-X importtime`, then optionally invoked once with a sample
+event. The report lists per-module import time, total import time,
+first-call latency and peak RSS, and can be checked against a baseline.
+
+Usage:
+    python coldstart_profile.py                          # profile every handler
+    python coldstart_profile.py --handler bmi.lambda_handler --event event.json
+    python coldstart_profile.py --output coldstart.json  # save a baseline
+    python coldstart_profile.py --baseline coldstart.json --tolerance 0.25
+"""
+import importlib
+import json
+import os
+import re
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SERVERLESS_FILE = os.path.join(ROOT, 'serverless.yml')
+
+_HANDLER_RE = re.compile(r'^\s*handler:\s*([\w.]+)', re.MULTILINE)
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+def read_handlers(path=SERVERLESS_FILE):
+    """Return the `module.function` handler strings declared in serverless.yml."""
+    with open(path, encoding='utf-8') as serverless_file:
+        return _HANDLER_RE.findall(serverless_file.read())
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into {module: (self_us, cumulative_us, depth)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+def max_rss_kb():
+    """Peak resident set size of this process in KB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def run_child(handler, event_path):
+    """Import (and optionally call) one handler, printing measurements as JSON on stdout."""
+    module_name, function_name = handler.rsplit('.', 1)
+    # Metrics flushed at exit would land after the JSON line the parent reads
+    os.environ.setdefault('METRICS_SINK', 'local')
+
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    function = getattr(module, function_name)
+    import_ms = (time.perf_counter() - start) * 1000
+    rss_after_import = max_rss_kb()
+
+    first_call_ms = None
+    status_code = None
+    if event_path:
+        with open(event_path, encoding='utf-8') as event_file:
+            event = json.load(event_file)
+        start = time.perf_counter()
+        response = function(event, None)
+        first_call_ms = (time.perf_counter() - start) * 1000
+        if isinstance(response, dict):
+            status_code = response.get('statusCode')
+
+    print(json.dumps({
+        'import_ms': import_ms,
+        'first_call_ms': first_call_ms,
+        'status_code': status_code,
+        'rss_after_import_kb': rss_after_import,
+        'max_rss_kb': max_rss_kb()
+    }))
+
+def profile_handler(handler, event_path=None, python=sys.executable):
+    """Profile one handler in a fresh interpreter and return its measurements."""
+    import subprocess
+
+    command = [python, '-X', 'importtime', os.path.abspath(__file__), '--child', handler]
+    if event_path:
+        command.append(event_path)
+
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'handler': handler, 'error': completed.stderr.strip().splitlines()[-1:]}
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(completed.stderr)
+    # Sum self time per top-level package, so e.g. all of botocore shows up as one line
+    packages = {}
+    for name, (self_us, _, _) in modules.items():
+        package = name.split('.', 1)[0]
+        packages[package] = packages.get(package, 0) + self_us / 1000
+    result['handler'] = handler
+    result['modules_ms'] = dict(sorted(packages.items(), key=lambda kv: kv[1], reverse=True))
+    return result
+
+def format_report(results, top=10):
+    """Render profiling results as a plain-text report, slowest handler first."""
+    lines = []
+    ordered = sorted(results, key=lambda r: r.get('import_ms', 0), reverse=True)
+    for result in ordered:
+        if 'error' in result:
+            lines.append(f"{result['handler']}: FAILED {' '.join(result['error'])}")
+            continue
+        first_call = result['first_call_ms']
+        first_call = f"{first_call:.1f} ms" if first_call is not None else 'n/a'
+        lines.append(
+            f"{result['handler']}: import {result['import_ms']:.1f} ms, "
+            f"first call {first_call}, max RSS {result['max_rss_kb'] / 1024:.1f} MB"
+        )
+        for name, ms in list(result['modules_ms'].items())[:top]:
+            lines.append(f"    {ms:9.1f} ms  {name}")
+    return '\n'.join(lines)
+
+def check_regressions(results, baseline, tolerance):
+    """Compare results with a saved baseline. Returns a list of human-readable regressions."""
+    previous = {r['handler']: r for r in baseline if 'error' not in r}
+    regressions = []
+    for result in results:
+        before = previous.get(result['handler'])
+        if before is None or 'error' in result:
+            continue
+        for metric in ('import_ms', 'first_call_ms', 'max_rss_kb'):
+            old, new = before.get(metric), result.get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{result['handler']} {metric}: {old:.1f} -> {new:.1f}")
+    return regressions
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handler', action='append', help='handler to profile (default: all in serverless.yml)')
+    parser.add_argument('--event', help='JSON event file to invoke each handler with once')
+    parser.add_argument('--top', type=int, default=10, help='modules to list per handler')
+    parser.add_argument('--output', help='write raw results as JSON (use as a future baseline)')
+    parser.add_argument('--baseline', help='baseline JSON file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown vs baseline (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    handlers = args.handler or read_handlers()
+    results = [profile_handler(handler, args.event) for handler in handlers]
+    print(format_report(results, args.top))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            regressions = check_regressions(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            print('\n'.join(f"    {line}" for line in regressions))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    # Child mode is parsed by hand so argparse/subprocess do not show up in the import profile
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Password hashing for registration and login.
+
+Hashes use scrypt, which is memory-hard. The cost (N = 2**ln) is picked once per
+container by timing a hash against PASSWORD_HASH_TARGET_MS, so hashing stays
+within a fixed latency budget on whatever CPU share the function's memory size
+buys. Parameters are stored with each hash. verify_password reports when a
+stored hash is cheaper than the current cost, so logins gradually move old
+hashes (and legacy plaintext rows) up to the current cost. Calibration runs
+on the first hash or verify in a container, so handlers that import this module
+without hashing (e.g. POST /subscribe through handler.py) never pay for it.
+
+hashlib.scrypt releases the GIL, so hashing runs in a small worker pool and the
+calling thread can keep doing I/O until it needs the result.
+"""
+import base64
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = 'scrypt'
+
+# Latency budget for one hash; the calibrated cost is the largest N that fits
+TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', '150'))
+# Cost bounds as log2(N). 2**14 is the floor recommended for interactive logins;
+# 2**17 with r=8 needs 128 MiB, which a 1024 MB function can spare.
+MIN_LN = int(os.environ.get('PASSWORD_SCRYPT_MIN_LN', '14'))
+MAX_LN = int(os.environ.get('PASSWORD_SCRYPT_MAX_LN', '17'))
+# Pin the cost instead of calibrating (e.g. to keep every container identical)
+FIXED_LN = os.environ.get('PASSWORD_SCRYPT_LN')
+BLOCK_SIZE = 8
+PARALLELISM = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+
+_lock = threading.Lock()
+_executor = None
+
+def _maxmem(ln, r):
+    # scrypt needs 128 * r * N bytes; leave headroom for OpenSSL's own bookkeeping
+    return 2 * 128 * r * (1 << ln)
+
+def _scrypt(password, salt, ln, r, p):
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=1 << ln, r=r, p=p,
+        maxmem=_maxmem(ln, r), dklen=KEY_BYTES
+    )
+
+def calibrate(target_ms=TARGET_MS, min_ln=MIN_LN, max_ln=MAX_LN, clock=time.perf_counter):
+    """Return the largest log2(N) whose hash time fits in `target_ms`, within [min_ln, max_ln].
+
+    scrypt time grows linearly with N, so one timed hash at the floor is enough
+    to extrapolate.
+    """
+    start = clock()
+    _scrypt('calibration', b'\0' * SALT_BYTES, min_ln, BLOCK_SIZE, PARALLELISM)
+    elapsed_ms = max((clock() - start) * 1000, 1e-3)
+    steps = int(math.floor(math.log2(target_ms / elapsed_ms))) if target_ms > elapsed_ms else 0
+    return max(min_ln, min(max_ln, min_ln + steps))
+
+# log2(N) for new hashes; calibrated by current_cost() on first use unless pinned
+_cost = int(FIXED_LN) if FIXED_LN else None
+
+def current_cost():
+    """log2(N) used for new hashes in this container."""
+    global _cost
+    if _cost is None:
+        with _lock:
+            if _cost is None:
+                _cost = calibrate()
+    return _cost
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+    return _executor
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+def hash_password(password, ln=None):
+    """Return an encoded hash: $scrypt$ln=<ln>,r=<r>,p=<p>$<salt>$<key>."""
+    ln = current_cost() if ln is None else ln
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _scrypt(password, salt, ln, BLOCK_SIZE, PARALLELISM)
+    return f'${SCHEME}$ln={ln},r={BLOCK_SIZE},p={PARALLELISM}${_b64(salt)}${_b64(key)}'
+
+def hash_password_async(password):
+    """Start hashing in the worker pool; returns a Future for the encoded hash."""
+    return get_executor().submit(hash_password, password)
+
+def parse_hash(encoded):
+    """Return (params, salt, key) for an encoded hash, or None if it is not one of ours."""
+    try:
+        _, scheme, params, salt, key = encoded.split('$')
+        if scheme != SCHEME:
+            return None
+        values = dict(pair.split('=', 1) for pair in params.split(','))
+        return {name: int(values[name]) for name in ('ln', 'r', 'p')}, _unb64(salt), _unb64(key)
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+def needs_rehash(encoded):
+    """True if the stored value is plaintext, unparseable or cheaper than the current cost."""
+    parsed = parse_hash(encoded)
+    if parsed is None:
+        return True
+    params = parsed[0]
+    return params['ln'] < current_cost() or params['r'] != BLOCK_SIZE or params['p'] != PARALLELISM
+
+# Stands in for the hash of a user that does not exist. Checking against it costs
+# the same scrypt work as a real account; the random key never matches.
+_dummy_hash = None
+
+def dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = (
+            {'ln': current_cost(), 'r': BLOCK_SIZE, 'p': PARALLELISM},
+            secrets.token_bytes(SALT_BYTES), secrets.token_bytes(KEY_BYTES)
+        )
+    return _dummy_hash
+
+def verify_password(password, stored):
+    """Check a password against a stored value.
+
+    Returns (matches, new_hash). new_hash is set when the password matched but
+    the stored value should be upgraded, including rows written before hashing
+    was added, which hold the plaintext password. A missing stored value is
+    checked against a dummy hash so it takes as long as a wrong password.
+    """
+    if not isinstance(password, str):
+        raise TypeError('password must be a string')
+    if not stored:
+        params, salt, key = dummy_hash()
+        _scrypt(password, salt, params['ln'], params['r'], params['p'])
+        return False, None
+    parsed = parse_hash(stored)
+    if parsed is None:
+        matches = hmac.compare_digest(password.encode('utf-8'), str(stored).encode('utf-8'))
+    else:
+        params, salt, key = parsed
+        matches = hmac.compare_digest(_scrypt(password, salt, params['ln'], params['r'], params['p']), key)
+    if matches and needs_rehash(stored):
+        return True, hash_password(password)
+    return matches, None
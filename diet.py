@@ -1,90 +1,209 @@
 import json
-import boto3
-from boto3.dynamodb.conditions import Key
+import os
+import sys
+import time
+from datetime import datetime
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('dietreport')
+import aws_clients
+import metrics
+import structured_log
+from api_response import DIET_CORS_HEADERS, json_response
 
-def lambda_handler(event, context):
+log = structured_log.get_logger(__name__)
+
+TABLE_NAME = 'dietreport'
+
+# Recommended daily servings for each food group
+RECOMMENDED_VALUES = {
+    "vegetables": 3,
+    "protein": 2,
+    "grains": 5,
+    "nutsSeeds": 1,
+    "dairy": 2,
+    "fruits": 2
+}
+
+# Map full food group names to reportId keys
+REPORT_ID_MAPPING = {
+    "vegetables": "veg",
+    "protein": "protein",
+    "grains": "grains",
+    "nutsSeeds": "nuts",
+    "dairy": "dairy",
+    "fruits": "fruits"
+}
+
+FOOD_GROUPS = ["vegetables", "protein", "grains", "nutsSeeds", "dairy", "fruits"]
+
+# Every possible reportId, keyed by (food group, intake category), e.g. ("nutsSeeds", "above") -> "nuts-above"
+REPORT_IDS = {
+    (group, category): f"{REPORT_ID_MAPPING[group]}-{category}"
+    for group in FOOD_GROUPS
+    for category in ("below", "at", "above")
+}
+
+# Bump when the layout of the snapshot file changes; older snapshots are ignored
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH = os.environ.get(
+    'DIET_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diet_snapshot.json')
+)
+
+# Warm-container cache of reportId -> recommendation text (at most 18 entries)
+_recommendation_cache = {}
+
+def determine_category(foodGroup, servings):
+    """Determine intake category (below, at, above) for a food group."""
+    recommended = RECOMMENDED_VALUES[foodGroup]
+    if servings < recommended:
+        return "below"
+    elif servings == recommended:
+        return "at"
+    else:
+        return "above"
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Seed the recommendation cache from a snapshot file. Returns False if it is missing or stale."""
     try:
-        # Get user input from the body of the request
-        body = json.loads(event['body'])  # Assuming you are sending a JSON payload
-        veggies = body.get('vegetables', 0)  # Provide default value if not found
-        protein = body.get('protein', 0)
-        grains = body.get('grains', 0)
-        nutsSeeds = body.get('nutsSeeds', 0)
-        dairy = body.get('dairy', 0)
-        fruits = body.get('fruits', 0)
-        
-        # Define the recommended values for each food group
-        recommended_values = {
-            "vegetables": 3,
-            "protein": 2,
-            "grains": 5,
-            "nutsSeeds": 1,
-            "dairy": 2,
-            "fruits": 2
-        }
-        
-        # Function to determine intake category (below, at, above)
-        def determine_category(foodGroup, servings):
-            if servings < recommended_values[foodGroup]:
-                return "below"
-            elif servings == recommended_values[foodGroup]:
-                return "at"
-            else:
-                return "above"
-        
-        # Map full food group names to reportId keys
-        report_id_mapping = {
-            "vegetables": "veg",
-            "protein": "protein",
-            "grains": "grains",
-            "nutsSeeds": "nuts",
-            "dairy": "dairy",
-            "fruits": "fruits"
+        with open(path, encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable diet snapshot: %s", e, path=path)
+        return False
+
+    # Runs at import, so a malformed snapshot must not raise; DynamoDB fills the cache instead
+    if not isinstance(snapshot, dict):
+        log.warning("Ignoring malformed diet snapshot", path=path)
+        return False
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return False
+
+    recommendations = snapshot.get('recommendations')
+    if not isinstance(recommendations, dict) or not all(
+        isinstance(k, str) and isinstance(v, str) for k, v in recommendations.items()
+    ):
+        log.warning("Ignoring malformed diet snapshot", path=path)
+        return False
+
+    _recommendation_cache.update(recommendations)
+    return True
+
+def write_snapshot(path=SNAPSHOT_PATH):
+    """Scan the dietreport table and write its recommendations to a snapshot file (run at deploy time)."""
+    table = aws_clients.get_table(TABLE_NAME)
+    recommendations = {}
+    scan_kwargs = {'ProjectionExpression': 'reportId, recommendation'}
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if 'recommendation' in item:
+                recommendations[item['reportId']] = item['recommendation']
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'generated_at': str(datetime.utcnow()),
+        'recommendations': recommendations
+    }
+    with open(path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump(snapshot, snapshot_file, separators=(',', ':'), sort_keys=True)
+    return len(recommendations)
+
+# How many times to re-request UnprocessedKeys before giving up
+MAX_BATCH_RETRIES = 3
+
+def fetch_recommendations(report_ids):
+    """Return {reportId: recommendation} for the given ids, using one BatchGetItem for cache misses."""
+    missing = [report_id for report_id in set(report_ids) if report_id not in _recommendation_cache]
+
+    if missing:
+        request_items = {
+            TABLE_NAME: {
+                'Keys': [{'reportId': report_id} for report_id in missing],
+                'ProjectionExpression': 'reportId, recommendation'
+            }
         }
-        
-        # Prepare recommendations
-        food_groups = ["vegetables", "protein", "grains", "nutsSeeds", "dairy", "fruits"]
-        user_intake = [veggies, protein, grains, nutsSeeds, dairy, fruits]
-        recommendations = {}
-
-        for i, group in enumerate(food_groups):
-            intake_category = determine_category(group, user_intake[i])
-            
-            # Use the report_id_mapping to create the correct report ID
-            mapped_group = report_id_mapping[group]  # Get the mapped name (e.g., 'veg' for 'vegetables')
-            report_id = f"{mapped_group}-{intake_category}"  # e.g., "veg-below", "nuts-above"
-            
-            try:
-                # Query DynamoDB for the recommendation based on reportId
-                response = table.query(
-                    KeyConditionExpression=Key('reportId').eq(report_id)
-                )
-                
-                # Get the message from DynamoDB
-                items = response.get('Items', [])
-                if items:
-                    recommendations[group] = items[0].get('recommendation', 'No recommendation available')
-                else:
-                    recommendations[group] = "No recommendation available"
-            except Exception as e:
-                recommendations[group] = f"Error fetching recommendation: {str(e)}"
-        
-        # Return the recommendations with CORS headers
+        attempt = 0
+        while request_items:
+            response = aws_clients.get_resource('dynamodb').batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(TABLE_NAME, []):
+                if 'recommendation' in item:
+                    _recommendation_cache[item['reportId']] = item['recommendation']
+
+            # Retry throttled keys with exponential backoff
+            request_items = response.get('UnprocessedKeys') or {}
+            if request_items:
+                attempt += 1
+                if attempt > MAX_BATCH_RETRIES:
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+
+    return {
+        report_id: _recommendation_cache[report_id]
+        for report_id in report_ids
+        if report_id in _recommendation_cache
+    }
+
+def validation_error(intake):
+    """Return a message if `intake` is not {food group: non-negative number of servings}, else None."""
+    if not isinstance(intake, dict):
+        return 'Expected a JSON object of daily servings'
+    for group in FOOD_GROUPS:
+        servings = intake.get(group, 0)
+        # bool is an int subclass, and NaN/inf would fall into "above"
+        if isinstance(servings, bool) or not isinstance(servings, (int, float)) or not 0 <= servings < float('inf'):
+            return f"{group} must be a non-negative number of servings"
+    return None
+
+def get_recommendations(intake):
+    """Return {food group: recommendation} for a dict of daily servings (missing groups count as 0)."""
+    # Look up the reportId for each food group, e.g. "veg-below", "nuts-above"
+    report_ids = {
+        group: REPORT_IDS[(group, determine_category(group, intake.get(group, 0)))]
+        for group in FOOD_GROUPS
+    }
+
+    # Fetch every needed recommendation in a single batch (or from the warm cache)
+    try:
+        found = fetch_recommendations(list(report_ids.values()))
         return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',  # Change this to your frontend domain in production
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': json.dumps(recommendations)
+            group: found.get(report_id, "No recommendation available")
+            for group, report_id in report_ids.items()
         }
     except Exception as e:
+        log.exception("Error fetching diet recommendations: %s", e)
         return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
+            group: f"Error fetching recommendation: {str(e)}"
+            for group in report_ids
         }
+
+@metrics.timed('POST /diet')
+def lambda_handler(event, context):
+    try:
+        # Get user input from the body of the request
+        body = json.loads(event['body'])  # Assuming you are sending a JSON payload
+        invalid = validation_error(body)
+        if invalid:
+            return json_response(400, {'error': invalid}, DIET_CORS_HEADERS)
+        recommendations = get_recommendations(body)
+
+        # Return the recommendations with CORS headers
+        return json_response(200, recommendations, DIET_CORS_HEADERS)
+    except Exception as e:
+        log.exception("Error building diet report: %s", e)
+        return json_response(500, {'error': str(e)}, DIET_CORS_HEADERS)
+
+# Serve from the bundled snapshot when present; DynamoDB only fills in gaps
+load_snapshot()
+
+if __name__ == '__main__':
+    # Usage: python diet.py [snapshot_path]
+    output_path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    count = write_snapshot(output_path)
+    print(f"Wrote {count} recommendations to {output_path}")
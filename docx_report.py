@@ -0,0 +1,152 @@
+"""Word (.docx) wellness report built from a template that is parsed once per container.
+
+`docx.Document(path)` unzips the template and parses every part on each call.
+Here the template is loaded once and kept in memory:
+- the main document's lxml tree stays parsed;
+- every other part, the content types and the package rels are written once
+  with PackageWriter and compressed into a base archive;
+- style IDs are resolved once.
+A report deep-copies only the main document tree, fills it in with the normal
+python-docx API, and appends that one part to a copy of the base archive in a
+BytesIO. Recompressing the static parts (styles.xml above all) would otherwise
+take about half of each render.
+
+Reports only add text. Content that adds parts (images, new headers) would not
+be written, because the list of parts is fixed when the template is loaded.
+
+PackageWriter, DocumentPart and Part.rels are python-docx internals, so
+python-docx is pinned in requirements.txt. tests/test_docx_report.py renders
+a report and reopens it with docx.Document; run it before changing the pin.
+"""
+import copy
+import io
+import json
+import os
+from types import MappingProxyType
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import docx
+from docx.document import Document
+from docx.opc.pkgwriter import PackageWriter
+from docx.opc.rel import Relationships
+from docx.parts.document import DocumentPart
+
+import metrics
+import structured_log
+import wellness_report
+from api_response import json_response
+
+log = structured_log.get_logger(__name__)
+
+DOCX_TEMPLATE_PATH = os.environ.get(
+    'DOCX_TEMPLATE_PATH',
+    os.path.join(os.path.dirname(docx.__file__), 'templates', 'default.docx')
+)
+
+DOCX_HEADERS = MappingProxyType({
+    'Content-Type': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'Content-Disposition': 'attachment; filename="wellness-report.docx"',
+    'Access-Control-Allow-Origin': '*',
+})
+
+def _copy_rels(rels):
+    copied = Relationships(rels._baseURI)
+    copied.update(rels)
+    copied._target_parts_by_rId.update(rels._target_parts_by_rId)
+    return copied
+
+class ParsedTemplate:
+    """A .docx template read once; new_document() hands out documents that share its static parts."""
+
+    def __init__(self, path):
+        self.template = docx.Document(path)
+        self.document_part = self.template.part
+        self._style_ids = {}
+
+        # Serialize the whole package once, then keep everything but the main document part
+        package = self.document_part.package
+        full = io.BytesIO()
+        PackageWriter.write(full, package.rels, package.parts)
+        partname = self.document_part.partname
+        self._document_members = (partname.membername, partname.rels_uri.membername)
+        base = io.BytesIO()
+        with ZipFile(full) as source, ZipFile(base, 'w', ZIP_DEFLATED) as target:
+            for info in source.infolist():
+                if info.filename not in self._document_members:
+                    target.writestr(info, source.read(info))
+        self._base = base.getvalue()
+
+    def style_id(self, name):
+        """Style ID for a style name, looked up in the template's styles part once."""
+        style_id = self._style_ids.get(name)
+        if style_id is None:
+            style_id = self._style_ids[name] = self.template.styles[name].style_id
+        return style_id
+
+    def new_document(self):
+        """Return a python-docx Document backed by a private copy of the main document tree."""
+        element = copy.deepcopy(self.document_part.element)
+        part = DocumentPart(
+            self.document_part.partname, self.document_part.content_type, element, self.document_part.package
+        )
+        # Part.rels is a lazy property; seed it with a copy that still points at the shared parts
+        part.__dict__['rels'] = _copy_rels(self.document_part.rels)
+        return Document(element, part)
+
+    def save(self, document):
+        """Return a BytesIO holding the base archive plus this document's main part."""
+        buffer = io.BytesIO(self._base)
+        document_member, rels_member = self._document_members
+        with ZipFile(buffer, 'a', ZIP_DEFLATED) as archive:
+            archive.writestr(document_member, document.part.blob)
+            archive.writestr(rels_member, document.part.rels.xml)
+        return buffer
+
+# Template path -> ParsedTemplate, filled on first use
+_templates = {}
+
+def get_template(path=DOCX_TEMPLATE_PATH):
+    template = _templates.get(path)
+    if template is None:
+        template = _templates[path] = ParsedTemplate(path)
+    return template
+
+def fill_document(document, request, template):
+    # Style IDs come from the template's cache; assigning a style by name searches styles.xml every time
+    document.add_paragraph(wellness_report.report_title(request))._p.style = template.style_id('Title')
+    document.add_paragraph().add_run(wellness_report.generated_line()).italic = True
+    for heading, entries in wellness_report.report_sections(request):
+        document.add_paragraph(heading)._p.style = template.style_id('Heading 1')
+        for label, text in entries:
+            if label is not None:
+                document.add_paragraph().add_run(label).bold = True
+            document.add_paragraph(text)
+
+def render_docx(request, output=None, template_path=DOCX_TEMPLATE_PATH):
+    """Render the report into `output` (any writable binary file); returns the BytesIO used if none is given."""
+    template = get_template(template_path)
+    document = template.new_document()
+    fill_document(document, request, template)
+    buffer = template.save(document)
+    if output is None:
+        return buffer
+    output.write(buffer.getbuffer())
+    return output
+
+@metrics.timed('POST /report/docx')
+def lambda_handler(event, context):
+    try:
+        request = json.loads(event.get('body') or '{}')
+        invalid = wellness_report.validation_error(request)
+        if invalid:
+            return invalid
+
+        with metrics.phase('render') as render:
+            buffer = render_docx(request)
+        log.info("Rendered report", bytes=buffer.tell(), renderMs=round(render.elapsed_ms, 1))
+        with metrics.phase('deliver'):
+            return wellness_report.deliver(request, buffer, 'docx', DOCX_HEADERS)
+
+    except Exception as e:
+        log.exception("Error rendering report: %s", e)
+        return json_response(500, {'error': str(e)})
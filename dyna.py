@@ -1,50 +1,236 @@
-import boto3
+"""Load reference data from CSV into DynamoDB.
+
+Rows are streamed from the CSV (quoted fields may span several lines), given
+deterministic content-hash IDs where the table needs one, grouped into
+numbered segments and written by parallel workers. Finished segments are
+recorded in a checkpoint file, so an interrupted load can be re-run and
+resumes where it stopped; re-writing a segment is harmless because IDs are
+derived from content.
+
+Loads only add and overwrite. With --prune, items whose keys are not in the
+CSV (rows since removed, or Q1..Q70 IDs from the old counter-based loader) are
+deleted once the whole file has been written.
+
+Usage:
+    python dyna.py questions Updated_Relationship_Questions_and_Feedback_with_Second_Person_Narration.csv
+    python dyna.py posture posture_reports.csv --workers 8
+    python dyna.py questions questions.csv --prune                                # also delete rows not in the CSV
+    python dyna.py diet diet_reports.csv --endpoint-url http://localhost:8000   # DynamoDB Local
+"""
+import argparse
 import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import aws_clients
+import fanout
+
+# BatchWriteItem accepts at most 25 puts per request
+BATCH_SIZE = 25
+MAX_BATCH_RETRIES = 8
+
+def content_id(*parts, prefix=''):
+    """Deterministic ID from row content, so re-running a load overwrites instead of duplicating."""
+    digest = hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return prefix + digest[:16]
+
+def question_item(row):
+    relationship_type = row['Relationship Type'].strip()
+    question = row['Question'].strip()
+    rating = int(row['Rating'])
+    return {
+        'RelationshipType': relationship_type,
+        'QuestionID': content_id(relationship_type, question, rating, prefix='Q'),
+        'QuestionText': question,  # Store the question text
+        'Rating': rating,
+        'AnswerOptions': [1, 2, 3, 4, 5],  # Assuming fixed scale answers from 1 to 5
+        'Category': 'General',  # No category provided, defaulting to 'General'
+        'FinalOutput': row['Final out put'].strip()  # Store the final output text
+    }
+
+def passthrough_item(key_name):
+    """Item builder that keeps every non-empty column and fills a missing key with a content hash."""
+    def build(row):
+        item = {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+        if not item.get(key_name):
+            item[key_name] = content_id(*sorted(item.items()))
+        return item
+    return build
+
+# Table and row -> item conversion for each kind of reference data
+PROFILES = {
+    'questions': {'table': 'QuestionsTable', 'key': ['RelationshipType', 'QuestionID'], 'build_item': question_item},
+    'posture': {'table': 'posturereport', 'key': ['posture_id'], 'build_item': passthrough_item('posture_id')},
+    'diet': {'table': 'dietreport', 'key': ['reportId'], 'build_item': passthrough_item('reportId')},
+}
+
+def iter_segments(path, build_item, segment_rows):
+    """Stream the CSV and yield (segment_number, items) in groups of `segment_rows`."""
+    with open(path, newline='', encoding='utf-8-sig') as csvfile:
+        segment = []
+        number = 0
+        for row in csv.DictReader(csvfile):
+            segment.append(build_item(row))
+            if len(segment) == segment_rows:
+                yield number, segment
+                number += 1
+                segment = []
+        if segment:
+            yield number, segment
+
+def item_key(item, key_names):
+    return tuple(item[k] for k in key_names)
+
+def batch_write(client, table_name, requests):
+    """Send put/delete requests with BatchWriteItem, retrying UnprocessedItems with backoff."""
+    for start in range(0, len(requests), BATCH_SIZE):
+        pending = {table_name: requests[start:start + BATCH_SIZE]}
+        attempt = 0
+        while pending:
+            response = client.batch_write_item(RequestItems=pending)
+            pending = response.get('UnprocessedItems') or {}
+            if pending:
+                attempt += 1
+                if attempt > MAX_BATCH_RETRIES:
+                    raise RuntimeError(f"Gave up on {len(pending[table_name])} unprocessed items")
+                time.sleep(min(0.05 * (2 ** attempt), 5))
+
+def write_segment(client, table_name, key_names, items):
+    """Write a segment of items; returns how many were written."""
+    # BatchWriteItem rejects requests that carry the same key twice; the last row wins
+    unique = {item_key(item, key_names): item for item in items}
+    batch_write(client, table_name, [{'PutRequest': {'Item': fanout.serialize(item)}} for item in unique.values()])
+    return len(unique)
+
+def iter_keys(client, table_name, key_names):
+    """Scan a table for the key attributes of every item."""
+    names = {f'#k{i}': name for i, name in enumerate(key_names)}
+    request = {'TableName': table_name, 'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+    while True:
+        page = client.scan(**request)
+        for item in page.get('Items', []):
+            yield fanout.deserialize(item)
+        if 'LastEvaluatedKey' not in page:
+            return
+        request['ExclusiveStartKey'] = page['LastEvaluatedKey']
 
-# Initialize the DynamoDB resource
-dynamodb = boto3.resource('dynamodb', region_name='us-west-2')  # Use your correct region
-
-# Update the table name to 'QuestionsTable' as discussed
-questions_table = dynamodb.Table('QuestionsTable')
-
-# Update the file path to the uploaded CSV file
-file_path = 'C:/Users/Praveen/Desktop/lambda/lambda-aws/Updated_Relationship_Questions_and_Feedback_with_Second_Person_Narration.csv'
-
-# Open the CSV file
-with open(file_path, newline='', encoding='utf-8') as csvfile:
-    csv_reader = csv.DictReader(csvfile)
-    
-    batch_size = 25  # DynamoDB batch limit
-    items_batch = []
-    question_id_counter = 1  # Initialize a counter for QuestionID
-    
-    for row in csv_reader:
-        # Generate a unique QuestionID using a counter
-        question_id = f"Q{question_id_counter}"
-        question_id_counter += 1
-        
-        # Prepare the item with the appropriate attributes
-        item = {
-            'RelationshipType': row['Relationship Type'],
-            'QuestionID': question_id,  # Generated unique Question ID
-            'QuestionText': row['Question'],  # Store the question text
-            'AnswerOptions': [1, 2, 3, 4, 5],  # Assuming fixed scale answers from 1 to 5
-            'Category': 'General',  # No category provided, defaulting to 'General'
-            'FinalOutput': row['Final out put']  # Store the final output text
+def prune(client, table_name, key_names, keep):
+    """Delete every item whose key is not in `keep`; returns how many were deleted."""
+    stale = [key for key in iter_keys(client, table_name, key_names) if item_key(key, key_names) not in keep]
+    batch_write(client, table_name, [{'DeleteRequest': {'Key': fanout.serialize(key)}} for key in stale])
+    return len(stale)
+
+class Checkpoint:
+    """Set of finished segment numbers for one (source file, table) pair, persisted as JSON."""
+
+    def __init__(self, path, source, table_name, segment_rows):
+        self.path = path
+        stat = os.stat(source)
+        self.identity = {
+            'source': os.path.abspath(source),
+            'size': stat.st_size,
+            'mtime': int(stat.st_mtime),
+            'table': table_name,
+            'segment_rows': segment_rows
         }
-        items_batch.append(item)
-        
-        # If the batch is full, write to DynamoDB and clear the batch
-        if len(items_batch) == batch_size:
-            with questions_table.batch_writer() as batch:
-                for item in items_batch:
-                    batch.put_item(Item=item)
-            items_batch = []  # Clear the batch after writing
-    
-    # Write remaining items in the last batch
-    if items_batch:
-        with questions_table.batch_writer() as batch:
-            for item in items_batch:
-                batch.put_item(Item=item)
-
-print("Data import completed successfully.")
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            # A checkpoint for a different file, table or segment size does not apply
+            if saved.get('identity') == self.identity:
+                self.completed = set(saved.get('completed', []))
+
+    def mark(self, segment_number):
+        self.completed.add(segment_number)
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump({'identity': self.identity, 'completed': sorted(self.completed)}, checkpoint_file)
+        os.replace(tmp_path, self.path)
+
+def load(path, profile, table_name=None, client=None, workers=4, segment_rows=500, checkpoint_path=None,
+         prune_missing=False):
+    """Load a CSV into DynamoDB. Returns {'written': n, 'segments': n, 'skipped_segments': n, 'deleted': n}.
+
+    With `prune_missing`, items whose keys are not in the CSV are deleted after the load.
+    """
+    settings = PROFILES[profile]
+    table_name = table_name or settings['table']
+    client = client or aws_clients.get_client('dynamodb')
+    checkpoint = Checkpoint(checkpoint_path, path, table_name, segment_rows)
+    stats = {'written': 0, 'segments': 0, 'skipped_segments': 0, 'deleted': 0}
+    # Keys in the CSV, including segments skipped on resume; only kept for --prune
+    loaded_keys = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        for number, items in iter_segments(path, settings['build_item'], segment_rows):
+            if prune_missing:
+                loaded_keys.update(item_key(item, settings['key']) for item in items)
+            if number in checkpoint.completed:
+                stats['skipped_segments'] += 1
+                continue
+
+            # Keep at most two segments per worker in memory
+            while len(in_flight) >= workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats['written'] += future.result()
+                    stats['segments'] += 1
+                    checkpoint.mark(in_flight.pop(future))
+
+            in_flight[executor.submit(write_segment, client, table_name, settings['key'], items)] = number
+
+        for future in list(in_flight):
+            stats['written'] += future.result()
+            stats['segments'] += 1
+            checkpoint.mark(in_flight.pop(future))
+
+    if prune_missing:
+        stats['deleted'] = prune(client, table_name, settings['key'], loaded_keys)
+
+    # The load finished, so the next run should start from scratch
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('profile', choices=sorted(PROFILES), help='kind of data being loaded')
+    parser.add_argument('csv_path', help='CSV file to load')
+    parser.add_argument('--table', help='override the target table name')
+    parser.add_argument('--region', default='us-west-2')  # Use your correct region
+    parser.add_argument('--endpoint-url', help='e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--segment-rows', type=int, default=500)
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <csv_path>.<profile>.checkpoint)')
+    parser.add_argument('--prune', action='store_true', help='after loading, delete items whose keys are not in the CSV')
+    args = parser.parse_args(argv)
+
+    client = aws_clients.get_session().client(
+        'dynamodb',
+        region_name=args.region,
+        endpoint_url=args.endpoint_url,
+        config=aws_clients.CLIENT_CONFIG
+    )
+    checkpoint_path = args.checkpoint or f"{args.csv_path}.{args.profile}.checkpoint"
+    stats = load(
+        args.csv_path, args.profile,
+        table_name=args.table,
+        client=client,
+        workers=args.workers,
+        segment_rows=args.segment_rows,
+        checkpoint_path=checkpoint_path,
+        prune_missing=args.prune
+    )
+    print(f"Data import completed successfully: {stats}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
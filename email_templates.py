@@ -0,0 +1,93 @@
+import html
+import os
+import re
+from functools import lru_cache
+
+SENDER_EMAIL = "info@dyadic.health"  # Replace with your verified sender email
+SES_REGION = os.environ.get('SES_REGION', 'us-west-2')
+
+# Transactional email sources, sent through the outbox. Placeholders use the {{name}}
+# syntax of SES templates.
+TEMPLATES = {
+    'subscription_confirmation': {
+        'subject': "Subscription Confirmation",
+        'text': "Hello {{first_name}},\n\nThank you for subscribing to our newsletter!",
+        'html': """<html>
+    <head></head>
+    <body>
+      <h1>Hello {{first_name}},</h1>
+      <p>Thank you for subscribing to our newsletter!</p>
+    </body>
+    </html>
+    """
+    },
+    'registration_welcome': {
+        'subject': "Welcome to Dyadic Health",
+        'text': "Hello {{first_name}},\n\nYour Dyadic Health account is ready. You can sign in with {{email}}.",
+        'html': """<html>
+    <head></head>
+    <body>
+      <h1>Welcome, {{first_name}}!</h1>
+      <p>Your Dyadic Health account is ready. You can sign in with {{email}}.</p>
+    </body>
+    </html>
+    """
+    },
+}
+
+_PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+def compile_source(source):
+    """Split a template source into alternating literal text and placeholder names.
+
+    The result is a tuple where even positions are literals and odd positions are names.
+    """
+    return tuple(_PLACEHOLDER_RE.split(source))
+
+@lru_cache(maxsize=32)
+def compile_template(name):
+    """Compile a named template once per container."""
+    template = TEMPLATES[name]
+    return {part: compile_source(source) for part, source in template.items()}
+
+def _render_parts(parts, params, escape):
+    pieces = list(parts)
+    for i in range(1, len(pieces), 2):
+        value = str(params.get(pieces[i], ''))
+        pieces[i] = html.escape(value) if escape else value
+    return ''.join(pieces)
+
+def render(name, params):
+    """Render a template to (subject, text, html). Values are HTML-escaped in the HTML part only."""
+    compiled = compile_template(name)
+    return (
+        _render_parts(compiled['subject'], params, False),
+        _render_parts(compiled['text'], params, False),
+        _render_parts(compiled['html'], params, True)
+    )
+
+def build_send_request(name, email, params):
+    """Build SES send_email arguments for one recipient."""
+    subject, body_text, body_html = render(name, params)
+    return {
+        'Destination': {
+            'ToAddresses': [email],
+        },
+        'Message': {
+            'Body': {
+                'Html': {
+                    'Charset': 'UTF-8',
+                    'Data': body_html,
+                },
+                'Text': {
+                    'Charset': 'UTF-8',
+                    'Data': body_text,
+                },
+            },
+            'Subject': {
+                'Charset': 'UTF-8',
+                'Data': subject,
+            },
+        },
+        'Source': SENDER_EMAIL,
+    }
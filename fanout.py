@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import aws_clients
+
+# Bounded worker pool shared by every handler in the container
+MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '8'))
+
+# Seconds to wait for a whole gather() before giving up on the calls still running
+DEFAULT_TIMEOUT = float(os.environ.get('FANOUT_TIMEOUT', '5'))
+
+_lock = threading.Lock()
+_executor = None
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+def get_executor():
+    """Return the per-process thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='fanout')
+    return _executor
+
+def get_client():
+    """Return the shared low-level DynamoDB client.
+
+    Unlike boto3 resource objects, clients are safe to share between threads.
+    """
+    return aws_clients.get_client('dynamodb')
+
+def serialize(item):
+    """Convert a plain dict into DynamoDB attribute values."""
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+def deserialize(item):
+    """Convert DynamoDB attribute values into the same shape the resource API returns."""
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+def get_item(table_name, key):
+    """GetItem through the shared client. Returns the item or None."""
+    response = get_client().get_item(TableName=table_name, Key=serialize(key))
+    item = response.get('Item')
+    return deserialize(item) if item else None
+
+def query_items(table_name, key_name, key_value, limit=None):
+    """Query a partition through the shared client and return its items."""
+    query_kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': '#k = :v',
+        'ExpressionAttributeNames': {'#k': key_name},
+        'ExpressionAttributeValues': {':v': _serializer.serialize(key_value)}
+    }
+    if limit:
+        query_kwargs['Limit'] = limit
+    response = get_client().query(**query_kwargs)
+    return [deserialize(item) for item in response.get('Items', [])]
+
+def gather(calls, timeout=DEFAULT_TIMEOUT, return_exceptions=False):
+    """Run (func, *args) tuples concurrently and return their results in order.
+
+    All calls share one deadline `timeout` seconds from now, so a slow call
+    cannot stretch the total wait. With return_exceptions=True a failed or
+    timed-out call yields its exception instead of raising, so callers can
+    degrade one section of a report without failing the others.
+    """
+    executor = get_executor()
+    futures = [executor.submit(call[0], *call[1:]) for call in calls]
+    _, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+
+    results = []
+    for future in futures:
+        if future in not_done:
+            error = FutureTimeoutError(f"Call did not finish within {timeout}s")
+        else:
+            error = future.exception()
+            if error is None:
+                results.append(future.result())
+                continue
+        if not return_exceptions:
+            raise error
+        results.append(error)
+    return results
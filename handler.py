@@ -1,22 +1,28 @@
 import json
-import boto3
+import os
 from botocore.exceptions import ClientError
 from datetime import datetime
 
-# Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+import auth
+import aws_clients
+from api_response import AUTH_POST_CORS_HEADERS, json_response
+import credentials
+import idempotency
+import metrics
+import outbox
+import structured_log
 
-# Initialize SES
-ses_client = boto3.client('ses', region_name='us-west-2')  # Replace with your actual SES region
+log = structured_log.get_logger(__name__)
 
-# Table for storing subscription data
-newsletter_table = dynamodb.Table('landingnewsletter')
+# Table for storing subscription data (newsletter_import reads the same variable)
+NEWSLETTER_TABLE = os.environ.get('NEWSLETTER_TABLE', 'landingnewsletter')
 
 # Table for storing registration data
-register_table = dynamodb.Table('Register_Data')  # Replace with your actual table name
+REGISTER_TABLE = 'Register_Data'  # Replace with your actual table name
 
 # =======================|| Register User Function ||========================
 
+@metrics.timed('POST /register')
 def register_user(event, context):
     try:
         # Parse the input data from the event
@@ -24,57 +30,139 @@ def register_user(event, context):
         email = body.get('email')
         first_name = body.get('firstName')
         last_name = body.get('lastName')
-        password = body.get('password')  # Ideally, hash this password
+        password = body.get('password')
 
         # Check if any required field is missing
         if not email or not first_name or not last_name or not password:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                    'Access-Control-Allow-Methods': 'POST, OPTIONS'
-                },
-                'body': json.dumps({'message': 'All fields are required!'})
-            }
-
-        # Store the registration data in the DynamoDB table
-        register_table.put_item(
-            Item={
+            return json_response(400, {'message': 'All fields are required!'}, AUTH_POST_CORS_HEADERS)
+        if not all(isinstance(value, str) for value in (email, first_name, last_name, password)):
+            return json_response(400, {'message': 'All fields must be strings!'}, AUTH_POST_CORS_HEADERS)
+        # Accounts are keyed by the normalized address, as are lockouts and tokens
+        email = auth.normalize_email(email)
+        if not idempotency.IDEMPOTENCY_HASH_KEY:
+            log.error("IDEMPOTENCY_HASH_KEY is not configured; refusing registrations")
+            return json_response(500, {'error': 'Registration is not available'}, AUTH_POST_CORS_HEADERS)
+
+        # A retried request replays the first response instead of writing again. The password
+        # is part of the fingerprint (keyed), so a different password is not answered by a replay.
+        fields = {
+            'email': email, 'firstName': first_name, 'lastName': last_name,
+            'password': idempotency.secret_digest(password)
+        }
+        request_fingerprint = idempotency.fingerprint(fields)
+        return idempotency.run_once(
+            idempotency.request_key(event, 'register', request_fingerprint),
+            request_fingerprint,
+            lambda: store_registration(email, first_name, last_name, password),
+            AUTH_POST_CORS_HEADERS
+        )
+
+    except ClientError as e:
+        # Log the error and return error response with CORS headers
+        log.exception("DynamoDB request failed: %s", e)
+        return json_response(500, {'error': str(e)}, AUTH_POST_CORS_HEADERS)
+
+def store_registration(email, first_name, last_name, password):
+    """Write a new account and queue its welcome email; an existing account is never overwritten."""
+    # Hash in the worker pool while the DynamoDB client is set up on this thread
+    password_hash = credentials.hash_password_async(password)
+    aws_clients.get_client('dynamodb')
+    with metrics.phase('hash'):
+        hashed = password_hash.result()
+
+    # Store the registration and queue its welcome email (sent by outbox.drain_handler) together
+    try:
+        outbox.put_with_email(
+            REGISTER_TABLE,
+            {
                 'email': email,
                 'firstName': first_name,
                 'lastName': last_name,
-                'password': password,  # This should be hashed before saving
+                'password': hashed,  # scrypt hash with its cost parameters
                 'created_at': str(datetime.utcnow())  # Add a timestamp of the registration
-            }
+            },
+            'registration_welcome',
+            email,
+            {'first_name': first_name, 'email': email},
+            condition='attribute_not_exists(email)'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return json_response(
+            409, {'code': 'account_exists', 'message': 'An account with this email already exists'}, AUTH_POST_CORS_HEADERS
         )
 
-        # Return success response with CORS headers
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
-            'body': json.dumps({'message': 'User registered successfully!'})
-        }
+    # Return success response with CORS headers
+    return json_response(200, {'message': 'User registered successfully!'}, AUTH_POST_CORS_HEADERS)
+
+# =======================|| Login User Function ||========================
+
+@metrics.timed('POST /login')
+def login_user(event, context):
+    try:
+        # Parse the input data from the event
+        body = json.loads(event['body'])
+        email = body.get('email')
+        password = body.get('password')
+
+        if not email or not password:
+            return json_response(400, {'message': 'Email and password are required!'}, AUTH_POST_CORS_HEADERS)
+        if not isinstance(email, str) or not isinstance(password, str):
+            return json_response(400, {'message': 'Email and password must be strings!'}, AUTH_POST_CORS_HEADERS)
+        email = auth.normalize_email(email)
+        if not auth.JWT_SECRET:
+            log.error("JWT_SECRET is not configured; refusing logins")
+            return json_response(500, {'error': 'Login is not available'}, AUTH_POST_CORS_HEADERS)
+
+        # Locked addresses are refused before any password check, registered or not
+        attempts = auth.login_attempts(email)
+        if auth.is_locked_out(attempts):
+            return json_response(429, {'message': 'Too many failed logins, try again later'}, AUTH_POST_CORS_HEADERS)
+
+        table = aws_clients.get_table(REGISTER_TABLE)
+        user = table.get_item(Key={'email': email}).get('Item')
+        stored = user.get('password') if user else None
+
+        # Unknown emails are checked against a dummy hash, so timing does not reveal registrations
+        with metrics.phase('verify'):
+            matches, new_hash = credentials.verify_password(password, stored)
+        if not matches:
+            auth.record_failure(email)
+            return json_response(401, {'message': 'Invalid email or password'}, AUTH_POST_CORS_HEADERS)
+        if attempts:
+            auth.clear_failures(email)
+
+        # Upgrade plaintext or below-cost hashes now that we know the password
+        if new_hash:
+            try:
+                table.update_item(
+                    Key={'email': email},
+                    UpdateExpression='SET #password = :new',
+                    ConditionExpression='#password = :old',
+                    ExpressionAttributeNames={'#password': 'password'},
+                    ExpressionAttributeValues={':new': new_hash, ':old': stored}
+                )
+            except ClientError as e:
+                # Someone changed the password meanwhile; their value wins
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        token, expires_in = auth.issue_token(email)
+        return json_response(
+            200,
+            {'message': 'Login successful!', 'token': token, 'tokenType': 'Bearer', 'expiresIn': expires_in},
+            AUTH_POST_CORS_HEADERS
+        )
 
     except ClientError as e:
         # Log the error and return error response with CORS headers
-        print(f"Error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
+        log.exception("DynamoDB request failed: %s", e)
+        return json_response(500, {'error': str(e)}, AUTH_POST_CORS_HEADERS)
 
 # =======================|| Subscribe User Function ||========================
 
+@metrics.timed('POST /subscribe')
 def subscribe_user(event, context):
     try:
         # Parse the input data from the event
@@ -84,91 +172,39 @@ def subscribe_user(event, context):
 
         # Check if required fields are present
         if not email or not first_name:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                    'Access-Control-Allow-Methods': 'POST, OPTIONS'
-                },
-                'body': json.dumps({'message': 'Email and First Name are required!'})
-            }
-
-        # Store the subscription data in the DynamoDB table
-        newsletter_table.put_item(
-            Item={
-                'email': email,
-                'firstName': first_name,
-                'subscribed_at': str(datetime.utcnow())  # Add a timestamp for the subscription
-            }
+            return json_response(400, {'message': 'Email and First Name are required!'}, AUTH_POST_CORS_HEADERS)
+        if not isinstance(email, str) or not isinstance(first_name, str):
+            return json_response(400, {'message': 'Email and First Name must be strings!'}, AUTH_POST_CORS_HEADERS)
+
+        # A retried request replays the first response instead of queueing a second email
+        fields = {'email': email.strip().lower(), 'firstName': first_name}
+        request_fingerprint = idempotency.fingerprint(fields)
+        return idempotency.run_once(
+            idempotency.request_key(event, 'subscribe', request_fingerprint),
+            request_fingerprint,
+            lambda: store_subscription(email, first_name),
+            AUTH_POST_CORS_HEADERS
         )
 
-        # Send subscription confirmation email
-        send_email(email, first_name)
-
-        # Return success response with CORS headers
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
-            'body': json.dumps({'message': 'Subscription successful!'})
-        }
-
     except ClientError as e:
         # Log the error and return error response with CORS headers
-        print(f"Error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS'
-            },
-            'body': json.dumps({'error': str(e)})
-        }
-
-# =======================|| Send Email Function Using SES ||========================
-
-def send_email(email, first_name):
-    sender_email = "info@dyadic.health"  # Replace with your verified sender email
-    subject = "Subscription Confirmation"
-    body_text = f"Hello {first_name},\n\nThank you for subscribing to our newsletter!"
-    body_html = f"""<html>
-    <head></head>
-    <body>
-      <h1>Hello {first_name},</h1>
-      <p>Thank you for subscribing to our newsletter!</p>
-    </body>
-    </html>
-    """
-
-    try:
-        # Use AWS SES to send the email
-        response = ses_client.send_email(
-            Destination={
-                'ToAddresses': [email],
-            },
-            Message={
-                'Body': {
-                    'Html': {
-                        'Charset': 'UTF-8',
-                        'Data': body_html,
-                    },
-                    'Text': {
-                        'Charset': 'UTF-8',
-                        'Data': body_text,
-                    },
-                },
-                'Subject': {
-                    'Charset': 'UTF-8',
-                    'Data': subject,
-                },
-            },
-            Source=sender_email,
-        )
-        print(f"Email sent! Message ID: {response['MessageId']}")
-    except ClientError as e:
-        print(f"Error sending email: {e}")
+        log.exception("DynamoDB request failed: %s", e)
+        return json_response(500, {'error': str(e)}, AUTH_POST_CORS_HEADERS)
+
+def store_subscription(email, first_name):
+    """Store the subscription and queue its confirmation email in a single transaction."""
+    # The email itself is sent later by outbox.drain_handler
+    outbox.put_with_email(
+        NEWSLETTER_TABLE,
+        {
+            'email': email,
+            'firstName': first_name,
+            'subscribed_at': str(datetime.utcnow())  # Add a timestamp for the subscription
+        },
+        'subscription_confirmation',
+        email,
+        {'first_name': first_name}
+    )
+
+    # Return success response with CORS headers
+    return json_response(200, {'message': 'Subscription successful!'}, AUTH_POST_CORS_HEADERS)
@@ -0,0 +1,185 @@
+"""Exactly-once handling for write endpoints that clients retry.
+
+API Gateway gives up on a slow request after 29 seconds, and the browser retries
+it. Without a guard the retry repeats the write and queues a second confirmation
+email. A request is identified by an idempotency key: the client's
+Idempotency-Key header if it sent one, otherwise the operation plus a digest
+of the fields it writes.
+
+The first request with a key claims it with a conditional put in
+IDEMPOTENCY_TABLE, runs, and stores its response on the claim. Later requests
+with that key get the stored response back and run nothing. Completed keys are
+also kept in a per-container cache, so a retry landing on the same warm
+container costs no DynamoDB call at all. Records expire through the table's TTL
+on `expires_at`.
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Attr
+
+import aws_clients
+import structured_log
+from api_response import json_response
+from ttl_cache import MISSING, TTLCache
+
+log = structured_log.get_logger(__name__)
+
+# Table keyed by `idempotencyKey`, with TTL enabled on `expires_at`
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE', 'idempotency_keys')
+
+# How long a completed response is replayed for
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+
+# A claim whose request has not finished within this many seconds can be taken over
+CLAIM_LEASE_SECONDS = 60
+
+# HMAC key for secrets that must be part of a fingerprint (e.g. a registration password)
+IDEMPOTENCY_HASH_KEY = os.environ.get('IDEMPOTENCY_HASH_KEY')
+
+# Suggested wait before retrying a request whose first attempt is still running
+RETRY_AFTER_SECONDS = 1
+
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024'))
+_completed = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+class RequestInProgress(Exception):
+    """Another request with the same key is still running."""
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different payload."""
+
+def fingerprint(payload):
+    """Stable digest of the request fields that must match for a replay (pass secrets through secret_digest)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def secret_digest(value):
+    """Keyed digest of a secret, safe to include in a fingerprint that is stored for a day."""
+    if not IDEMPOTENCY_HASH_KEY:
+        raise RuntimeError('IDEMPOTENCY_HASH_KEY is not configured')
+    return hmac.new(IDEMPOTENCY_HASH_KEY.encode('utf-8'), value.encode('utf-8'), hashlib.sha256).hexdigest()
+
+def request_key(event, operation, request_fingerprint):
+    """Key for a request: the Idempotency-Key header if present, else the request's fingerprint."""
+    headers = event.get('headers') or {}
+    supplied = next((v for k, v in headers.items() if k.lower() == 'idempotency-key' and v), None)
+    if supplied:
+        return f"{operation}:client:{supplied}"
+    return f"{operation}:{request_fingerprint}"
+
+def _stored_response(record):
+    response = record['response']
+    return {
+        'statusCode': int(response['statusCode']),
+        'headers': dict(response.get('headers') or {}),
+        'body': response['body']
+    }
+
+def _replay(key, record, request_fingerprint):
+    if record.get('fingerprint') != request_fingerprint:
+        raise KeyReused(key)
+    response = _stored_response(record)
+    _completed.put(key, (request_fingerprint, dict(response, headers=dict(response['headers']))))
+    return response
+
+def claim(table, key, request_fingerprint, now):
+    """Take the key, or return the stored record if it is already completed."""
+    token = uuid.uuid4().hex
+    try:
+        table.put_item(
+            Item={
+                'idempotencyKey': key,
+                'status': 'in_progress',
+                'token': token,
+                'fingerprint': request_fingerprint,
+                'expires_at': now + CLAIM_LEASE_SECONDS
+            },
+            ConditionExpression=Attr('idempotencyKey').not_exists() | Attr('expires_at').lt(now)
+        )
+        return token, None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    record = table.get_item(Key={'idempotencyKey': key}, ConsistentRead=True).get('Item')
+    if record and record.get('status') == 'completed':
+        return None, record
+    raise RequestInProgress(key)
+
+def complete(table, key, token, response, now):
+    """Store the response on our claim so retries can replay it."""
+    table.update_item(
+        Key={'idempotencyKey': key},
+        UpdateExpression='SET #status = :completed, #response = :response, expires_at = :expires_at',
+        ConditionExpression=Attr('token').eq(token),
+        ExpressionAttributeNames={'#status': 'status', '#response': 'response'},
+        ExpressionAttributeValues={
+            ':completed': 'completed',
+            ':response': {
+                'statusCode': response['statusCode'],
+                'headers': dict(response.get('headers') or {}),
+                'body': response['body']
+            },
+            ':expires_at': now + IDEMPOTENCY_TTL_SECONDS
+        }
+    )
+
+def release(table, key, token):
+    """Drop our claim after a failure so the client's retry can run the request again."""
+    try:
+        table.delete_item(Key={'idempotencyKey': key}, ConditionExpression=Attr('token').eq(token))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def run_once(key, request_fingerprint, action, headers, clock=time.time):
+    """Run `action()` (which returns a Lambda response) at most once per key.
+
+    Server errors (5xx, or an exception from `action`) release the key so a retry
+    runs again; any other response is stored and replayed for later requests.
+    """
+    cached = _completed.get(key)
+    if cached is not MISSING:
+        cached_fingerprint, response = cached
+        if cached_fingerprint == request_fingerprint:
+            return dict(response, headers=dict(response['headers']))
+
+    table = aws_clients.get_table(IDEMPOTENCY_TABLE)
+    now = int(clock())
+    try:
+        token, record = claim(table, key, request_fingerprint, now)
+        if record is not None:
+            return _replay(key, record, request_fingerprint)
+    except RequestInProgress:
+        return json_response(
+            429,
+            {'code': 'request_in_progress', 'message': 'This request is already being processed'},
+            dict(headers, **{'Retry-After': str(RETRY_AFTER_SECONDS)})
+        )
+    except KeyReused:
+        return json_response(
+            422, {'code': 'idempotency_key_reused', 'message': 'Idempotency key was already used for a different request'},
+            headers
+        )
+
+    try:
+        response = action()
+    except Exception:
+        release(table, key, token)
+        raise
+
+    if response['statusCode'] >= 500:
+        release(table, key, token)
+        return response
+
+    try:
+        complete(table, key, token, response, now)
+    except ClientError as e:
+        # The write itself succeeded; a lost record only means a retry may run it again
+        log.warning("Error storing idempotency record: %s", e, idempotencyKey=key)
+    _completed.put(key, (request_fingerprint, dict(response, headers=dict(response['headers']))))
+    return response
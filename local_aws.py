@@ -0,0 +1,512 @@
+"""In-process DynamoDB and SES stand-ins for local runs and benchmarks.
+
+Only the calls the handlers actually make are implemented. Items are stored
+the way the resource API returns them (numbers as Decimal), every call can
+be given an artificial latency, and `install()` makes aws_clients hand out
+these fakes instead of real boto3 objects.
+"""
+import copy
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import ConditionBase
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import aws_clients
+
+# (partition key, sort key) for the tables this project uses
+KEY_SCHEMAS = {
+    'QuestionsTable': ('RelationshipType', 'QuestionID'),
+    'posturereport': ('posture_id', None),
+    'dietreport': ('reportId', None),
+    'landingnewsletter': ('email', None),
+    'Register_Data': ('email', None),
+    'email_outbox': ('messageId', None),
+    'idempotency_keys': ('idempotencyKey', None),
+    'login_attempts': ('email', None),
+}
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+def _normalize(item):
+    """Round-trip through the DynamoDB type system so ints come back as Decimal, like the real API."""
+    return {k: _deserializer.deserialize(_serializer.serialize(v)) for k, v in item.items()}
+
+def _client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+class Latency:
+    """Artificial per-operation latency in seconds: a default plus optional per-operation overrides."""
+
+    def __init__(self, default=0.0, per_operation=None):
+        self.default = default
+        self.per_operation = per_operation or {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.per_operation.get(operation, self.default)
+        if delay:
+            time.sleep(delay)
+
+# ---------------------------------------------------------------------------
+# Expression evaluation
+# ---------------------------------------------------------------------------
+
+def evaluate_condition(condition, item):
+    """Evaluate a boto3.dynamodb.conditions object against a plain item."""
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+
+    def resolve(value):
+        if hasattr(value, 'name') and not isinstance(value, ConditionBase):
+            return item.get(value.name)
+        return value
+
+    if operator == 'AND':
+        return evaluate_condition(values[0], item) and evaluate_condition(values[1], item)
+    if operator == 'OR':
+        return evaluate_condition(values[0], item) or evaluate_condition(values[1], item)
+    if operator == 'NOT':
+        return not evaluate_condition(values[0], item)
+    if operator == 'attribute_exists':
+        return values[0].name in item
+    if operator == 'attribute_not_exists':
+        return values[0].name not in item
+    if operator == 'begins_with':
+        actual = resolve(values[0])
+        return isinstance(actual, str) and actual.startswith(values[1])
+    if operator == 'IN':
+        return resolve(values[0]) in values[1]
+    if operator == 'BETWEEN':
+        actual = resolve(values[0])
+        return actual is not None and values[1] <= actual <= values[2]
+
+    left, right = resolve(values[0]), resolve(values[1])
+    if operator == '=':
+        return left == right
+    if operator == '<>':
+        return left != right
+    if left is None or right is None:
+        return False
+    return {
+        '<': left < right,
+        '<=': left <= right,
+        '>': left > right,
+        '>=': left >= right,
+    }[operator]
+
+def _to_condition(expression, names, values):
+    """Accept either a condition object or a string expression with placeholder maps."""
+    if expression is None or isinstance(expression, ConditionBase):
+        return expression
+    return _StringCondition(expression, names or {}, values or {})
+
+class _StringCondition:
+    """Evaluator for the small subset of string expressions used in this project:
+    comparisons, IN (...), attribute_exists/attribute_not_exists, joined by AND."""
+
+    _CLAUSE_RE = re.compile(
+        r'^\s*(?:(attribute_exists|attribute_not_exists)\(\s*([#\w.]+)\s*\)'
+        r'|([#\w.]+)\s*(=|<>|<=|>=|<|>)\s*([:\w]+)'
+        r'|([#\w.]+)\s+IN\s*\(([^)]*)\))\s*$',
+        re.IGNORECASE
+    )
+
+    def __init__(self, expression, names, values):
+        self.clauses = []
+        for clause in re.split(r'\s+AND\s+', expression, flags=re.IGNORECASE):
+            match = self._CLAUSE_RE.match(clause)
+            if not match:
+                raise NotImplementedError(f"Unsupported expression: {clause}")
+            self.clauses.append(match.groups())
+        self.names = names
+        self.values = values
+
+    def _name(self, token):
+        return self.names.get(token, token)
+
+    def _value(self, token):
+        return self.values[token] if token.startswith(':') else token
+
+    def matches(self, item):
+        for function, function_arg, left, operator, right, in_left, in_values in self.clauses:
+            if function:
+                exists = self._name(function_arg) in item
+                if exists != (function.lower() == 'attribute_exists'):
+                    return False
+            elif in_left:
+                options = [self._value(v.strip()) for v in in_values.split(',')]
+                if item.get(self._name(in_left)) not in options:
+                    return False
+            else:
+                actual, expected = item.get(self._name(left)), self._value(right)
+                if operator == '=' and actual != expected:
+                    return False
+                if operator == '<>' and actual == expected:
+                    return False
+                if operator in ('<', '<=', '>', '>='):
+                    if actual is None:
+                        return False
+                    if not {'<': actual < expected, '<=': actual <= expected,
+                            '>': actual > expected, '>=': actual >= expected}[operator]:
+                        return False
+        return True
+
+def _matches(condition, item):
+    if condition is None:
+        return True
+    if isinstance(condition, _StringCondition):
+        return condition.matches(item)
+    return evaluate_condition(condition, item)
+
+def _project(item, projection, names=None):
+    if not projection:
+        return copy.deepcopy(item)
+    wanted = [(names or {}).get(p.strip(), p.strip()) for p in projection.split(',')]
+    return {k: copy.deepcopy(item[k]) for k in wanted if k in item}
+
+_UPDATE_ACTION_RE = re.compile(r'\b(SET|ADD|REMOVE)\s+', re.IGNORECASE)
+
+def _apply_update(item, expression, names, values):
+    """Apply `SET a = :x, #b = :y`, `ADD n :one` and `REMOVE c, #d` clauses, in any order.
+
+    Returns the names of the attributes that were set or added to.
+    """
+    parts = _UPDATE_ACTION_RE.split(expression)
+    if parts[0].strip() or len(parts) < 3:
+        raise NotImplementedError(f"Unsupported update: {expression}")
+    updated = []
+    for action, clauses in zip(parts[1::2], parts[2::2]):
+        for clause in (c.strip() for c in clauses.split(',') if c.strip()):
+            action = action.upper()
+            if action == 'REMOVE':
+                item.pop(names.get(clause, clause), None)
+                continue
+            if action == 'SET':
+                name, value = (part.strip() for part in clause.split('='))
+                name = names.get(name, name)
+                item[name] = values[value]
+            else:
+                name, value = clause.split()
+                name = names.get(name, name)
+                item[name] = item.get(name, 0) + values[value]
+            updated.append(name)
+    return updated
+
+# ---------------------------------------------------------------------------
+# DynamoDB
+# ---------------------------------------------------------------------------
+
+class FakeTable:
+    """Resource-style Table backed by a dict."""
+
+    def __init__(self, name, latency, key_schema=None):
+        self.name = self.table_name = name
+        self.latency = latency
+        self.partition_key, self.sort_key = key_schema or KEY_SCHEMAS.get(name, ('id', None))
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        return (item[self.partition_key], item.get(self.sort_key) if self.sort_key else None)
+
+    def _sorted(self, items):
+        return sorted(items, key=lambda i: (str(i[self.partition_key]), str(i.get(self.sort_key, ''))))
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self.latency('PutItem')
+        item = _normalize(Item)
+        condition = _to_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        with self._lock:
+            key = self._key(item)
+            if condition is not None and not _matches(condition, self.items.get(key, {})):
+                raise _client_error('ConditionalCheckFailedException', 'The conditional request failed', 'PutItem')
+            self.items[key] = item
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, **kwargs):
+        self.latency('GetItem')
+        item = self.items.get(self._key(Key))
+        return {'Item': _project(item, ProjectionExpression)} if item else {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self.latency('DeleteItem')
+        condition = _to_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        with self._lock:
+            key = self._key(Key)
+            if condition is not None and not _matches(condition, self.items.get(key, {})):
+                raise _client_error('ConditionalCheckFailedException', 'The conditional request failed', 'DeleteItem')
+            self.items.pop(key, None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues=None, **kwargs):
+        self.latency('UpdateItem')
+        names = ExpressionAttributeNames or {}
+        values = _normalize(ExpressionAttributeValues or {})
+        condition = _to_condition(ConditionExpression, names, values)
+        with self._lock:
+            key = self._key(Key)
+            item = self.items.get(key, dict(Key))
+            if condition is not None and not _matches(condition, item):
+                raise _client_error('ConditionalCheckFailedException', 'The conditional request failed', 'UpdateItem')
+            updated = _apply_update(item, UpdateExpression, names, values)
+            self.items[key] = item
+            if ReturnValues == 'UPDATED_NEW':
+                return {'Attributes': {name: copy.deepcopy(item[name]) for name in updated}}
+            if ReturnValues == 'ALL_NEW':
+                return {'Attributes': copy.deepcopy(item)}
+        return {}
+
+    def _page(self, items, Limit=None, ExclusiveStartKey=None):
+        items = self._sorted(items)
+        if ExclusiveStartKey:
+            start = self._key(ExclusiveStartKey)
+            keys = [self._key(i) for i in items]
+            items = items[keys.index(start) + 1:] if start in keys else items
+        page = items[:Limit] if Limit else items
+        response = {'Count': len(page)}
+        if Limit and len(items) > Limit:
+            last = page[-1]
+            response['LastEvaluatedKey'] = {
+                k: last[k] for k in (self.partition_key, self.sort_key) if k
+            }
+        return page, response
+
+    def query(self, KeyConditionExpression, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, FilterExpression=None, **kwargs):
+        self.latency('Query')
+        key_condition = _to_condition(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        item_filter = _to_condition(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        matching = [i for i in self.items.values() if _matches(key_condition, i)]
+        page, response = self._page(matching, Limit, ExclusiveStartKey)
+        response['Items'] = [
+            _project(i, ProjectionExpression, ExpressionAttributeNames) for i in page if _matches(item_filter, i)
+        ]
+        return response
+
+    def scan(self, FilterExpression=None, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self.latency('Scan')
+        item_filter = _to_condition(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        page, response = self._page(list(self.items.values()), Limit, ExclusiveStartKey)
+        response['Items'] = [
+            _project(i, ProjectionExpression, ExpressionAttributeNames) for i in page if _matches(item_filter, i)
+        ]
+        return response
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _FakeBatchWriter(self)
+
+class _FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def put_item(self, Item):
+        self.pending.append(Item)
+        if len(self.pending) >= 25:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.table.latency('BatchWriteItem')
+            for item in self.pending:
+                self.table.items[self.table._key(item)] = _normalize(item)
+            self.pending = []
+
+class FakeDynamoDB:
+    """Both the resource (`Table`, `batch_get_item`) and low-level client calls used by the handlers."""
+
+    def __init__(self, latency=None, key_schemas=None):
+        self.latency = latency or Latency()
+        self.key_schemas = dict(KEY_SCHEMAS, **(key_schemas or {}))
+        self.tables = {}
+        self._lock = threading.RLock()
+
+    # -- resource API --
+
+    def Table(self, name):
+        with self._lock:
+            table = self.tables.get(name)
+            if table is None:
+                table = FakeTable(name, self.latency, self.key_schemas.get(name, ('id', None)))
+                self.tables[name] = table
+        return table
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.latency('BatchGetItem')
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            found = [table.items.get(table._key(key)) for key in request['Keys']]
+            responses[name] = [_project(i, request.get('ProjectionExpression')) for i in found if i]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    # -- low-level client API (attribute-value shaped) --
+
+    def _wire(self, item):
+        return {k: _serializer.serialize(v) for k, v in item.items()}
+
+    def _plain(self, item):
+        return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+    def get_item(self, TableName, Key, **kwargs):
+        response = self.Table(TableName).get_item(Key=self._plain(Key))
+        return {'Item': self._wire(response['Item'])} if 'Item' in response else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        return self.Table(TableName).put_item(
+            Item=self._plain(Item),
+            ConditionExpression=ConditionExpression,
+            ExpressionAttributeNames=ExpressionAttributeNames,
+            ExpressionAttributeValues=self._plain(ExpressionAttributeValues or {})
+        )
+
+    def query(self, TableName, ExpressionAttributeValues=None, **kwargs):
+        values = self._plain(ExpressionAttributeValues or {})
+        if 'ExclusiveStartKey' in kwargs:
+            kwargs['ExclusiveStartKey'] = self._plain(kwargs['ExclusiveStartKey'])
+        response = self.Table(TableName).query(ExpressionAttributeValues=values, **kwargs)
+        response['Items'] = [self._wire(i) for i in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = self._wire(response['LastEvaluatedKey'])
+        return response
+
+    def scan(self, TableName, ExpressionAttributeValues=None, **kwargs):
+        values = self._plain(ExpressionAttributeValues or {})
+        if 'ExclusiveStartKey' in kwargs:
+            kwargs['ExclusiveStartKey'] = self._plain(kwargs['ExclusiveStartKey'])
+        response = self.Table(TableName).scan(ExpressionAttributeValues=values, **kwargs)
+        response['Items'] = [self._wire(i) for i in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = self._wire(response['LastEvaluatedKey'])
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.latency('BatchWriteItem')
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            for request in requests:
+                if 'DeleteRequest' in request:
+                    table.items.pop(table._key(self._plain(request['DeleteRequest']['Key'])), None)
+                    continue
+                item = _normalize(self._plain(request['PutRequest']['Item']))
+                table.items[table._key(item)] = item
+        return {'UnprocessedItems': {}}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        self.latency('TransactWriteItems')
+        with self._lock:
+            # Check every condition before applying any put, so the transaction is all-or-nothing
+            reasons = []
+            for action in TransactItems:
+                put = action['Put']
+                table = self.Table(put['TableName'])
+                item = _normalize(self._plain(put['Item']))
+                condition = _to_condition(
+                    put.get('ConditionExpression'),
+                    put.get('ExpressionAttributeNames'),
+                    self._plain(put.get('ExpressionAttributeValues') or {})
+                )
+                failed = condition is not None and not _matches(condition, table.items.get(table._key(item), {}))
+                reasons.append({'Code': 'ConditionalCheckFailed' if failed else 'None'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                # Real DynamoDB reports one reason per action, in order
+                raise ClientError({
+                    'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                    'CancellationReasons': reasons
+                }, 'TransactWriteItems')
+            for action in TransactItems:
+                put = action['Put']
+                table = self.Table(put['TableName'])
+                item = _normalize(self._plain(put['Item']))
+                table.items[table._key(item)] = item
+        return {}
+
+# ---------------------------------------------------------------------------
+# SES
+# ---------------------------------------------------------------------------
+
+class FakeSES:
+    """Records every email instead of sending it."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.sent = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _message_id(self):
+        with self._lock:
+            self._counter += 1
+            return f"local-{self._counter}"
+
+    def send_email(self, Destination, Message, Source, **kwargs):
+        self.latency('SendEmail')
+        message_id = self._message_id()
+        self.sent.append({'MessageId': message_id, 'Destination': Destination, 'Message': Message, 'Source': Source})
+        return {'MessageId': message_id}
+
+# ---------------------------------------------------------------------------
+# Wiring
+# ---------------------------------------------------------------------------
+
+class LocalAWS:
+    """A DynamoDB and SES stand-in pair sharing one latency profile."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.dynamodb = FakeDynamoDB(self.latency)
+        self.ses = FakeSES(self.latency)
+
+    def client(self, service_name, region_name=None):
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        if service_name == 'ses':
+            return self.ses
+        raise NotImplementedError(f"No local stand-in for {service_name}")
+
+    def resource(self, service_name, region_name=None):
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        raise NotImplementedError(f"No local stand-in for {service_name}")
+
+    def table(self, table_name, region_name=None):
+        return self.dynamodb.Table(table_name)
+
+_originals = None
+
+def install(local=None):
+    """Point aws_clients at in-memory stand-ins. Returns the LocalAWS instance in use."""
+    global _originals
+    local = local or LocalAWS()
+    if _originals is None:
+        _originals = (aws_clients.get_client, aws_clients.get_resource, aws_clients.get_table)
+    aws_clients.get_client = local.client
+    aws_clients.get_resource = local.resource
+    aws_clients.get_table = local.table
+    return local
+
+def uninstall():
+    """Restore the real aws_clients functions."""
+    global _originals
+    if _originals is not None:
+        aws_clients.get_client, aws_clients.get_resource, aws_clients.get_table = _originals
+        _originals = None
@@ -0,0 +1,345 @@
+"""Latency metrics for routes, handler phases and AWS calls, flushed as CloudWatch EMF.
+
+Three families of timings, all in milliseconds:
+    Latency             whole invocation, by Route
+    PhaseLatency        a named block inside a handler (`with metrics.phase('render')`), by Route and Phase
+    DependencyLatency   every botocore call (DynamoDB, SES, S3, ...), by Service and Operation
+DependencyErrors counts calls that failed or returned an error status.
+Modules may add their own counters with `record(..., unit='Count')`, e.g.
+PostureCache (hits, misses and table reads of posture.py's report cache).
+
+AWS calls are timed by botocore event hooks that aws_clients registers on the
+session, so handler code does not change. The time runs from parameter
+validation to the parsed response and includes retries.
+
+Samples go into log-bucketed histograms (about 2.5% resolution) kept in the
+process. At the end of every invocation they are written to stdout as
+embedded metric format (EMF) lines. CloudWatch Logs turns those lines into
+metrics, so no extra network call is made. Each line carries at most 100 values
+per metric, the EMF limit. A bucket seen n times is written as its
+representative value repeated n times, so CloudWatch percentiles match the
+in-process ones. METRICS_FLUSH_SECONDS > 0 batches invocations into fewer lines,
+but samples still held when a container is reclaimed are lost and are stamped
+with the flush time, so leave it at 0 unless log volume matters more.
+
+Offline:
+- METRICS_SINK=local keeps everything in memory; `summary()` and
+  `format_summary()` report count, p50, p99 and max (bench.py --metrics does this).
+- `python metrics.py logs.txt ...` aggregates EMF lines from exported
+  CloudWatch logs, or from stdin, into the same table.
+"""
+import atexit
+import contextvars
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import structured_log
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DyadicHealth')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+METRICS_SINK = os.environ.get('METRICS_SINK', 'emf')
+FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '0'))
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+
+# EMF accepts at most 100 values per metric in one log line
+MAX_VALUES_PER_LINE = 100
+
+# =======================|| Histograms ||========================
+
+GROWTH = 1.05
+_LOG_GROWTH = math.log(GROWTH)
+MIN_VALUE = 0.001  # ms; anything faster lands in the first bucket
+
+class Histogram:
+    """Counts per logarithmic bucket plus exact count, sum, min and max."""
+
+    __slots__ = ('buckets', 'count', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        # floor, not int(): values under 1 ms have negative logs and int() would round them up a bucket
+        index = math.floor(math.log(max(value, MIN_VALUE)) / _LOG_GROWTH)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @staticmethod
+    def bucket_value(index):
+        """Geometric middle of a bucket, rounded to keep log lines short."""
+        return float(f'{GROWTH ** (index + 0.5):.3g}')
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Clamp so tiny samples report values that were actually observed
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def values(self):
+        """Every sample as its bucket's value, in ascending order."""
+        for index in sorted(self.buckets):
+            value = self.bucket_value(index)
+            for _ in range(self.buckets[index]):
+                yield value
+
+# =======================|| Registry ||========================
+
+# (metric name, unit, ((dimension, value), ...)) -> Histogram
+_histograms = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+def record(name, value, unit='Milliseconds', **dimensions):
+    """Add one sample to the histogram for `name` and these dimensions."""
+    if not METRICS_ENABLED:
+        return
+    key = (name, unit, tuple(sorted(dimensions.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.add(value)
+
+def drain():
+    """Take every histogram collected so far, leaving the registry empty."""
+    global _histograms
+    with _lock:
+        drained, _histograms = _histograms, {}
+    return drained
+
+def snapshot():
+    """Copy of the histograms collected so far, leaving the registry as it is."""
+    with _lock:
+        copies = {}
+        for key, histogram in _histograms.items():
+            copy = copies[key] = Histogram()
+            copy.merge(histogram)
+        return copies
+
+# =======================|| EMF output ||========================
+
+def emf_lines(histograms, timestamp_ms=None):
+    """Yield EMF JSON lines for `histograms`, at most MAX_VALUES_PER_LINE values per line."""
+    timestamp_ms = timestamp_ms or int(time.time() * 1000)
+    for (name, unit, dimensions), histogram in histograms.items():
+        # Counts are summed exactly; bucketing would turn 1 error into 1.02
+        values = [histogram.sum] if unit == 'Count' else list(histogram.values())
+        for start in range(0, len(values), MAX_VALUES_PER_LINE):
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp_ms,
+                    'CloudWatchMetrics': [{
+                        'Namespace': NAMESPACE,
+                        'Dimensions': [[dimension for dimension, _ in dimensions]],
+                        'Metrics': [{'Name': name, 'Unit': unit}]
+                    }]
+                },
+                name: values[start:start + MAX_VALUES_PER_LINE]
+            }
+            document.update(dimensions)
+            if FUNCTION_NAME:
+                document['FunctionName'] = FUNCTION_NAME
+            yield json.dumps(document, separators=(',', ':'))
+
+def flush(stream=None):
+    """Write everything collected so far as EMF lines (a no-op with METRICS_SINK=local)."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if METRICS_SINK == 'local':
+        return
+    histograms = drain()
+    if histograms:
+        stream = stream or sys.stdout
+        stream.write(''.join(line + '\n' for line in emf_lines(histograms)))
+        stream.flush()
+
+def flush_if_due():
+    if time.monotonic() - _last_flush >= FLUSH_SECONDS:
+        flush()
+
+# Scripts and batch jobs exit normally; Lambda containers rely on flush_if_due
+atexit.register(flush)
+
+# =======================|| Handlers and phases ||========================
+
+# Route of the invocation being served, for phase metrics
+_route = contextvars.ContextVar('metrics_route', default=None)
+
+def timed(route):
+    """Decorate a Lambda handler: time it under `route` and bind its logging context.
+
+    Also flushes metrics after the invocation when they are due. This is the
+    entry decorator for every handler; it applies structured_log.logged.
+    """
+    def decorate(handler):
+        logged = structured_log.logged(route)(handler)
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not METRICS_ENABLED:
+                return logged(event, context)
+            token = _route.set(route)
+            start = time.perf_counter()
+            try:
+                return logged(event, context)
+            finally:
+                record('Latency', (time.perf_counter() - start) * 1000, Route=route)
+                _route.reset(token)
+                flush_if_due()
+        return wrapper
+    return decorate
+
+class phase:
+    """Context manager timing a block of a handler as PhaseLatency for the current route.
+
+    The measured time is also left on `elapsed_ms` for callers that log it.
+    """
+
+    __slots__ = ('name', 'start', 'elapsed_ms')
+
+    def __init__(self, name):
+        self.name = name
+        self.elapsed_ms = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed_ms = (time.perf_counter() - self.start) * 1000
+        if METRICS_ENABLED:
+            record('PhaseLatency', self.elapsed_ms, Route=_route.get() or 'none', Phase=self.name)
+        return False
+
+# =======================|| botocore hooks ||========================
+
+_START_KEY = 'metrics_started'
+
+def _call_started(context, **kwargs):
+    context[_START_KEY] = time.perf_counter()
+
+def _call_finished(model, context, http_response=None, exception=None, **kwargs):
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    service = model.service_model.service_name
+    record('DependencyLatency', (time.perf_counter() - started) * 1000, Service=service, Operation=model.name)
+    if exception is not None or (http_response is not None and http_response.status_code >= 300):
+        record('DependencyErrors', 1, unit='Count', Service=service, Operation=model.name)
+
+def _call_failed(context, event_name, **kwargs):
+    # after-call-error carries no model; the event name is "after-call-error.<service>.<operation>"
+    started = context.pop(_START_KEY, None)
+    if started is None:
+        return
+    _, service, operation = event_name.split('.', 2)
+    record('DependencyLatency', (time.perf_counter() - started) * 1000, Service=service, Operation=operation)
+    record('DependencyErrors', 1, unit='Count', Service=service, Operation=operation)
+
+def instrument_session(session):
+    """Register the timing hooks on a boto3 session; clients created from it afterwards are timed."""
+    if not METRICS_ENABLED:
+        return
+    events = session.events
+    events.register('before-parameter-build', _call_started, unique_id='metrics-call-started')
+    events.register('after-call', _call_finished, unique_id='metrics-call-finished')
+    events.register('after-call-error', _call_failed, unique_id='metrics-call-failed')
+
+# =======================|| Offline aggregation ||========================
+
+def summary(histograms=None):
+    """[{metric, dimensions, count, p50, p99, max}] for `histograms` (default: collected so far)."""
+    histograms = snapshot() if histograms is None else histograms
+    rows = []
+    for (name, unit, dimensions), histogram in sorted(histograms.items()):
+        rows.append({
+            'metric': name,
+            'dimensions': ' '.join(f'{key}={value}' for key, value in dimensions),
+            'count': histogram.count,
+            'p50': histogram.percentile(50),
+            'p99': histogram.percentile(99),
+            'max': histogram.max
+        })
+    return rows
+
+def format_summary(rows):
+    header = f"{'metric':20} {'dimensions':48} {'count':>7} {'p50':>9} {'p99':>9} {'max':>9}"
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['metric']:20} {row['dimensions']:48} {row['count']:7d} "
+            f"{row['p50']:9.3f} {row['p99']:9.3f} {row['max']:9.3f}"
+        )
+    return '\n'.join(lines)
+
+def aggregate_emf(lines, histograms=None):
+    """Merge EMF lines (other log lines are skipped) into {(name, unit, dimensions): Histogram}."""
+    histograms = {} if histograms is None else histograms
+    for line in lines:
+        start = line.find('{"_aws"')
+        if start < 0:
+            continue
+        try:
+            document = json.loads(line[start:])
+        except ValueError:
+            continue
+        for directive in document['_aws'].get('CloudWatchMetrics', []):
+            for dimension_set in directive.get('Dimensions') or [[]]:
+                dimensions = tuple(sorted((key, document.get(key)) for key in dimension_set))
+                for metric in directive['Metrics']:
+                    values = document.get(metric['Name'])
+                    if values is None:
+                        continue
+                    key = (metric['Name'], metric.get('Unit', 'None'), dimensions)
+                    histogram = histograms.get(key)
+                    if histogram is None:
+                        histogram = histograms[key] = Histogram()
+                    for value in values if isinstance(values, list) else [values]:
+                        histogram.add(value)
+    return histograms
+
+def main(argv=None):
+    import argparse  # CLI only; kept off the Lambda import path
+
+    parser = argparse.ArgumentParser(description='Aggregate EMF log lines into p50/p99 per metric.')
+    parser.add_argument('files', nargs='*', help='log files (default: stdin)')
+    args = parser.parse_args(argv)
+
+    histograms = {}
+    if args.files:
+        for path in args.files:
+            with open(path, encoding='utf-8') as log_file:
+                aggregate_emf(log_file, histograms)
+    else:
+        aggregate_emf(sys.stdin, histograms)
+    print(format_summary(summary(histograms)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import base64
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import metrics
+import structured_log
+from api_response import AUTH_POST_CORS_HEADERS, json_response
+
+log = structured_log.get_logger(__name__)
+
+# Same table handler.subscribe_user writes to; read here so imports don't load handler's dependencies
+NEWSLETTER_TABLE = os.environ.get('NEWSLETTER_TABLE', 'landingnewsletter')
+
+# Bucket that partner lists are uploaded to for large imports. Only keys under
+# UPLOAD_PREFIX can be imported; results are written under RESULTS_PREFIX.
+IMPORT_BUCKET = os.environ.get('NEWSLETTER_IMPORT_BUCKET')
+UPLOAD_PREFIX = 'uploads/'
+
+# Function that imports uploaded lists in the background. API Gateway gives up
+# after 29 seconds, so lists in S3 are never imported inside the HTTP request.
+IMPORT_WORKER_FUNCTION = os.environ.get('NEWSLETTER_IMPORT_WORKER')
+RESULTS_PREFIX = 'results/'
+
+# Inline bodies above this many lines must be uploaded to IMPORT_BUCKET instead
+MAX_INLINE_LINES = int(os.environ.get('NEWSLETTER_MAX_INLINE_LINES', '5000'))
+
+# Rows rejected beyond this many are counted but not listed individually
+MAX_REPORTED_ROWS = 1000
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+def iter_lines(stream):
+    """Decode a binary stream into text lines without reading it all at once."""
+    return codecs.iterdecode(stream, 'utf-8-sig')
+
+def iter_records(lines, file_format):
+    """Yield (row_number, record) pairs from CSV or JSONL lines.
+
+    CSV rows may span several lines (quoted fields), so row numbers count records, not lines.
+    """
+    if file_format == 'csv':
+        row_number = 0
+        try:
+            for row_number, row in enumerate(csv.DictReader(lines), start=1):
+                yield row_number, row
+        except csv.Error as e:
+            # e.g. a field over csv.field_size_limit(); the reader cannot resync after it
+            raise ValueError(f"Malformed CSV after row {row_number}: {e}") from e
+    elif file_format == 'jsonl':
+        row_number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield row_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+def iter_outcomes(records):
+    """Validate and de-duplicate records, yielding (row_number, email, status, item)."""
+    seen = set()
+    for row_number, record in records:
+        if record is None:
+            yield row_number, None, 'invalid', None
+            continue
+
+        email = record.get('email') or ''
+        first_name = record.get('firstName') or ''
+        # JSONL rows can hold any JSON type; a bad row is invalid, not a failed import
+        if not isinstance(email, str) or not isinstance(first_name, str):
+            yield row_number, email if isinstance(email, str) else None, 'invalid', None
+            continue
+        email, first_name = email.strip(), first_name.strip()
+        if not _EMAIL_RE.match(email) or not first_name:
+            yield row_number, email, 'invalid', None
+            continue
+
+        key = email.lower()
+        if key in seen:
+            yield row_number, email, 'duplicate', None
+            continue
+        seen.add(key)
+
+        yield row_number, email, 'imported', {
+            'email': email,
+            'firstName': first_name,
+            'subscribed_at': str(datetime.utcnow()),
+            'source': 'bulk_import'
+        }
+
+def import_records(records, table=None):
+    """Write valid, unique records with batch_writer and return a summary with rejected rows.
+
+    batch_writer sends 25-item BatchWriteItem requests and resubmits UnprocessedItems.
+    """
+    table = table or aws_clients.get_table(NEWSLETTER_TABLE)
+    summary = {'imported': 0, 'invalid': 0, 'duplicate': 0, 'rejected': []}
+
+    with table.batch_writer(overwrite_by_pkeys=['email']) as batch:
+        for row_number, email, status, item in iter_outcomes(records):
+            summary[status] += 1
+            if item is not None:
+                batch.put_item(Item=item)
+            elif len(summary['rejected']) < MAX_REPORTED_ROWS:
+                summary['rejected'].append({'row': row_number, 'email': email, 'status': status})
+
+    return summary
+
+def parse_request(event):
+    """Return ('inline', lines, format) or ('upload', key, format) for an import request.
+
+    Small lists can be posted inline as text/csv or application/x-ndjson. Larger ones are
+    uploaded to IMPORT_BUCKET first and referenced as {"key": ..., "format": ...}.
+    """
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    content_type = headers.get('content-type', 'application/json').split(';')[0].strip()
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8-sig')
+
+    if content_type in ('text/csv', 'application/x-ndjson', 'application/jsonl'):
+        if body.count('\n') > MAX_INLINE_LINES:
+            raise ValueError(f"Inline lists are limited to {MAX_INLINE_LINES} lines; upload larger ones to S3")
+        if content_type == 'text/csv':
+            return 'inline', io.StringIO(body, newline=''), 'csv'
+        return 'inline', io.StringIO(body), 'jsonl'
+
+    request = json.loads(body)
+    key = request.get('key') if isinstance(request, dict) else None
+    if not isinstance(key, str) or not key.startswith(UPLOAD_PREFIX) or not IMPORT_BUCKET:
+        raise ValueError(f"Expected a CSV/JSONL body or the key of a file uploaded under {UPLOAD_PREFIX}")
+    file_format = request.get('format') or ('jsonl' if key.endswith('.jsonl') else 'csv')
+    if file_format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unsupported format: {file_format}")
+    return 'upload', key, file_format
+
+def result_key(job_id):
+    return f"{RESULTS_PREFIX}{job_id}.json"
+
+def start_import(key, file_format):
+    """Queue a background import of an uploaded list; returns the job ID."""
+    job_id = uuid.uuid4().hex
+    aws_clients.get_client('lambda').invoke(
+        FunctionName=IMPORT_WORKER_FUNCTION,
+        InvocationType='Event',
+        Payload=json.dumps({'jobId': job_id, 'key': key, 'format': file_format}).encode('utf-8')
+    )
+    return job_id
+
+def api_key_id(event):
+    """ID of the API key the request was made with; API Gateway only sets it on `private: true` endpoints."""
+    return ((event.get('requestContext') or {}).get('identity') or {}).get('apiKeyId')
+
+@metrics.timed('POST /subscribe/import')
+def import_subscribers(event, context):
+    if not api_key_id(event):
+        return json_response(403, {'message': 'An API key is required'}, AUTH_POST_CORS_HEADERS)
+    try:
+        source, value, file_format = parse_request(event)
+        if source == 'inline':
+            return json_response(200, import_records(iter_records(value, file_format)), AUTH_POST_CORS_HEADERS)
+
+        job_id = start_import(value, file_format)
+        return json_response(
+            202, {'jobId': job_id, 'status': 'queued', 'resultKey': result_key(job_id)}, AUTH_POST_CORS_HEADERS
+        )
+
+    except ValueError as e:
+        return json_response(400, {'message': str(e)}, AUTH_POST_CORS_HEADERS)
+
+    except ClientError as e:
+        # Log the error and return error response with CORS headers
+        log.exception("Error importing subscribers: %s", e)
+        return json_response(500, {'error': str(e)}, AUTH_POST_CORS_HEADERS)
+
+@metrics.timed('async importSubscribers')
+def process_import(event, context):
+    """Background worker: stream an uploaded list from S3, import it and store the summary under results/."""
+    s3 = aws_clients.get_client('s3')
+    try:
+        s3_object = s3.get_object(Bucket=IMPORT_BUCKET, Key=event['key'])
+        lines = iter_lines(s3_object['Body'].iter_lines(keepends=True))
+        summary = dict(import_records(iter_records(lines, event['format'])), status='completed')
+    except Exception as e:
+        # Always write a result; otherwise import_status would report the job as running forever
+        log.exception("Error importing subscribers: %s", e, jobId=event['jobId'])
+        summary = {'status': 'failed', 'error': str(e)}
+    s3.put_object(
+        Bucket=IMPORT_BUCKET, Key=result_key(event['jobId']),
+        Body=json.dumps(summary).encode('utf-8'), ContentType='application/json'
+    )
+    return summary
+
+@metrics.timed('GET /subscribe/import/{jobId}')
+def import_status(event, context):
+    """Return a background import's summary, or 202 while it is still running."""
+    if not api_key_id(event):
+        return json_response(403, {'message': 'An API key is required'}, AUTH_POST_CORS_HEADERS)
+    job_id = (event.get('pathParameters') or {}).get('jobId') or ''
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return json_response(400, {'message': 'Invalid job ID'}, AUTH_POST_CORS_HEADERS)
+    try:
+        s3_object = aws_clients.get_client('s3').get_object(Bucket=IMPORT_BUCKET, Key=result_key(job_id))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return json_response(202, {'jobId': job_id, 'status': 'running'}, AUTH_POST_CORS_HEADERS)
+        log.exception("Error reading import result: %s", e)
+        return json_response(500, {'error': str(e)}, AUTH_POST_CORS_HEADERS)
+    return json_response(200, json.loads(s3_object['Body'].read()), AUTH_POST_CORS_HEADERS)
@@ -0,0 +1,238 @@
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from botocore.exceptions import BotoCoreError, ClientError
+from boto3.dynamodb.conditions import Key
+
+import aws_clients
+import email_templates
+import fanout
+import metrics
+import structured_log
+
+log = structured_log.get_logger(__name__)
+
+# Table holding one record per queued email, keyed by `messageId`
+OUTBOX_TABLE = os.environ.get('EMAIL_OUTBOX_TABLE', 'email_outbox')
+
+# Sparse GSI listing only records still to be sent: partition key `due_queue` (S),
+# sort key `next_attempt_at` (N), projection ALL. Sent and failed records drop
+# `due_queue`, so the drain never reads the sent rows kept for SENT_RETENTION_SECONDS.
+OUTBOX_DUE_INDEX = os.environ.get('EMAIL_OUTBOX_DUE_INDEX', 'due-index')
+DUE_QUEUE = 'due'
+
+# SES sending limits (emails per second) and retry policy
+MAX_SEND_RATE = float(os.environ.get('SES_MAX_SEND_RATE', '14'))
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+
+# A claimed record is retried if its sender has not finished within this many seconds
+CLAIM_LEASE_SECONDS = 300
+
+# Records are removed by the table's TTL on `expires_at` this long after they are sent
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Maximum records handled by one drain run
+DRAIN_BATCH_SIZE = 100
+
+def idempotency_key(template, email):
+    """Deterministic outbox key, so a repeated enqueue finds the existing message instead of sending again."""
+    return hashlib.sha256(f"{template}:{email.strip().lower()}".encode('utf-8')).hexdigest()
+
+def outbox_record(template, email, params, now=None):
+    """Build a pending outbox record for one email."""
+    now = int(now if now is not None else time.time())
+    return {
+        'messageId': idempotency_key(template, email),
+        'template': template,
+        'email': email,
+        'params': params,
+        'status': 'pending',
+        'due_queue': DUE_QUEUE,
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': str(datetime.utcnow())
+    }
+
+def _rejected_by_conditions(error):
+    """True if a put_with_email transaction was cancelled only by its condition expressions."""
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = [reason.get('Code') for reason in error.response.get('CancellationReasons') or []]
+    return bool(reasons) and all(reason in ('None', 'ConditionalCheckFailed') for reason in reasons)
+
+def put_with_email(table_name, item, template, email, params, condition=None):
+    """Write `item` to `table_name` and queue an email for it in one DynamoDB transaction.
+
+    An email already queued or sent for the same template and address is left
+    alone, so re-subscribing does not send it twice; only `item` is written then.
+    With `condition` (e.g. 'attribute_not_exists(email)') the item is only written
+    if it holds, and ConditionalCheckFailedException is raised, with no email
+    queued, if it does not. Returns True if a new email was queued.
+    """
+    client = aws_clients.get_client('dynamodb')
+    item_put = {'TableName': table_name, 'Item': fanout.serialize(item)}
+    if condition:
+        item_put['ConditionExpression'] = condition
+    try:
+        client.transact_write_items(
+            TransactItems=[
+                {'Put': item_put},
+                {'Put': {
+                    'TableName': OUTBOX_TABLE,
+                    'Item': fanout.serialize(outbox_record(template, email, params)),
+                    'ConditionExpression': 'attribute_not_exists(messageId)'
+                }}
+            ]
+        )
+        return True
+    except ClientError as e:
+        if not _rejected_by_conditions(e):
+            raise
+    # Writes the item alone, or raises ConditionalCheckFailedException if its own condition failed
+    client.put_item(**item_put)
+    return False
+
+def build_email_request(record):
+    """Turn an outbox record into SES send_email arguments."""
+    return email_templates.build_send_request(record['template'], record['email'], record.get('params', {}))
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = 1.0
+        self.updated_at = clock()
+
+    def acquire(self):
+        while True:
+            now = self.clock()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            self.sleep((1 - self.tokens) / self.rate)
+
+def due_records(table, now, limit=DRAIN_BATCH_SIZE):
+    """Return up to `limit` records that are pending, or whose claim lease has run out, oldest first."""
+    query_kwargs = {
+        'IndexName': OUTBOX_DUE_INDEX,
+        'KeyConditionExpression': Key('due_queue').eq(DUE_QUEUE) & Key('next_attempt_at').lte(now),
+        'Limit': limit
+    }
+    records = []
+    while len(records) < limit:
+        response = table.query(**query_kwargs)
+        records.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return records[:limit]
+
+def claim(table, record, now):
+    """Mark a record as being sent. Returns False if another sender got to it first."""
+    try:
+        table.update_item(
+            Key={'messageId': record['messageId']},
+            UpdateExpression='SET #status = :sending, attempts = :next_attempts, next_attempt_at = :lease',
+            ConditionExpression='attempts = :attempts AND #status IN (:pending, :sending)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':sending': 'sending',
+                ':pending': 'pending',
+                ':attempts': record['attempts'],
+                ':next_attempts': record['attempts'] + 1,
+                ':lease': now + CLAIM_LEASE_SECONDS
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def mark_sent(table, record, ses_message_id, now):
+    table.update_item(
+        Key={'messageId': record['messageId']},
+        UpdateExpression='SET #status = :sent, ses_message_id = :ses_id, sent_at = :now, expires_at = :expires '
+                         'REMOVE due_queue',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':sent': 'sent',
+            ':ses_id': ses_message_id,
+            ':now': now,
+            ':expires': now + SENT_RETENTION_SECONDS
+        }
+    )
+
+def mark_failed_attempt(table, record, error, now, permanent=False):
+    """Schedule a retry with exponential backoff, or give up after MAX_ATTEMPTS
+    (at once if `permanent`). Returns the new status."""
+    attempts = record['attempts'] + 1
+    status = 'failed' if permanent or attempts >= MAX_ATTEMPTS else 'pending'
+    # A record that has given up leaves the due index
+    remove = ' REMOVE due_queue' if status == 'failed' else ''
+    table.update_item(
+        Key={'messageId': record['messageId']},
+        UpdateExpression='SET #status = :status, next_attempt_at = :next, last_error = :error' + remove,
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':status': status,
+            ':next': now + RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+            ':error': str(error)
+        }
+    )
+    return status
+
+def drain_outbox(table=None, ses_client=None, limit=DRAIN_BATCH_SIZE, rate=MAX_SEND_RATE, clock=time.time):
+    """Send due outbox emails, respecting the SES send rate. Returns counts per outcome.
+
+    `table` and `ses_client` default to the shared AWS clients; pass stand-ins to run locally.
+    """
+    table = table or aws_clients.get_table(OUTBOX_TABLE)
+    ses_client = ses_client or aws_clients.get_client('ses', email_templates.SES_REGION)
+    limiter = RateLimiter(rate)
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0, 'skipped': 0}
+
+    for record in due_records(table, int(clock()), limit):
+        record['attempts'] = int(record.get('attempts', 0))
+        if not claim(table, record, int(clock())):
+            counts['skipped'] += 1
+            continue
+
+        try:
+            request = build_email_request(record)
+        except KeyError as e:
+            # An unknown template will not appear on retry; fail the record now
+            mark_failed_attempt(table, record, f"Unknown template: {e}", int(clock()), permanent=True)
+            counts['failed'] += 1
+            log.error("Outbox email has an unknown template", messageId=record['messageId'], template=record.get('template'))
+            continue
+
+        limiter.acquire()
+        try:
+            response = ses_client.send_email(**request)
+        except (ClientError, BotoCoreError) as e:
+            # BotoCoreError covers connection and read timeouts, which have no SES error code
+            status = mark_failed_attempt(table, record, e, int(clock()))
+            counts['failed' if status == 'failed' else 'retrying'] += 1
+            log.warning("Error sending outbox email: %s", e, messageId=record['messageId'], status=status)
+            continue
+
+        mark_sent(table, record, response['MessageId'], int(clock()))
+        counts['sent'] += 1
+
+    return counts
+
+@metrics.timed('schedule drainEmailOutbox')
+def drain_handler(event, context):
+    """Scheduled entry point that drains the email outbox."""
+    counts = drain_outbox()
+    log.info("Outbox drained", **counts)
+    return counts
@@ -0,0 +1,168 @@
+"""PDF wellness report covering recovery, diet and posture, rendered with reportlab.
+
+Work that does not depend on the user happens once per container:
+- fonts are registered at import, which is when the TTFs get parsed;
+- paragraph styles are built once and never modified;
+- header and footer text is measured once.
+Inside each document the page furniture is drawn once into a form XObject. Every
+page then places it with a single `Do` operator instead of redrawing it.
+
+Report content and delivery (inline or via S3) live in wellness_report.
+"""
+import io
+import json
+import os
+from types import MappingProxyType
+from xml.sax.saxutils import escape
+
+import reportlab
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer
+
+import metrics
+import structured_log
+import wellness_report
+from api_response import json_response
+
+log = structured_log.get_logger(__name__)
+
+PDF_HEADERS = MappingProxyType({
+    'Content-Type': 'application/pdf',
+    'Content-Disposition': 'inline; filename="wellness-report.pdf"',
+    'Access-Control-Allow-Origin': '*',
+})
+
+# =======================|| Fonts and styles (once per container) ||========================
+
+FONT_DIR = os.environ.get('PDF_FONT_DIR', os.path.join(os.path.dirname(reportlab.__file__), 'fonts'))
+FONT_FILES = (
+    ('Vera', 'Vera.ttf'),
+    ('Vera-Bold', 'VeraBd.ttf'),
+    ('Vera-Italic', 'VeraIt.ttf'),
+    ('Vera-BoldItalic', 'VeraBI.ttf'),
+)
+
+def register_fonts():
+    """Parse and register the report fonts; a no-op if this process already did."""
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    for name, filename in FONT_FILES:
+        if name not in registered:
+            pdfmetrics.registerFont(TTFont(name, os.path.join(FONT_DIR, filename)))
+    pdfmetrics.registerFontFamily(
+        'Vera', normal='Vera', bold='Vera-Bold', italic='Vera-Italic', boldItalic='Vera-BoldItalic'
+    )
+
+register_fonts()
+
+BRAND_COLOR = colors.HexColor('#2f5d62')
+
+# Built once instead of calling getSampleStyleSheet() per request; treat as read-only
+STYLES = MappingProxyType({
+    'title': ParagraphStyle('title', fontName='Vera-Bold', fontSize=20, leading=24, textColor=BRAND_COLOR,
+                            spaceAfter=4 * mm),
+    'subtitle': ParagraphStyle('subtitle', fontName='Vera-Italic', fontSize=9, leading=12, textColor=colors.grey,
+                               spaceAfter=6 * mm),
+    'heading': ParagraphStyle('heading', fontName='Vera-Bold', fontSize=13, leading=16, textColor=BRAND_COLOR,
+                              spaceBefore=6 * mm, spaceAfter=2 * mm),
+    'label': ParagraphStyle('label', fontName='Vera-Bold', fontSize=10, leading=13, spaceBefore=2 * mm),
+    'body': ParagraphStyle('body', fontName='Vera', fontSize=10, leading=14, spaceAfter=2 * mm),
+})
+
+# =======================|| Page furniture ||========================
+
+PAGE_SIZE = letter
+MARGIN = 20 * mm
+HEADER_HEIGHT = 14 * mm
+BRAND_TEXT = 'Dyadic Health'
+HEADER_TEXT = 'Wellness Report'
+FOOTER_TEXT = 'This report is for general wellness information and is not medical advice.'
+FURNITURE_FORM = 'pageFurniture'
+
+# Static text is measured once per container rather than on every page
+_HEADER_TEXT_WIDTH = pdfmetrics.stringWidth(HEADER_TEXT, 'Vera', 10)
+
+def draw_furniture(canvas):
+    """Draw the header band, rule and footer note (everything except the page number)."""
+    width, height = PAGE_SIZE
+    canvas.setFillColor(BRAND_COLOR)
+    canvas.rect(0, height - HEADER_HEIGHT, width, HEADER_HEIGHT, stroke=0, fill=1)
+    canvas.setFillColor(colors.white)
+    canvas.setFont('Vera-Bold', 12)
+    canvas.drawString(MARGIN, height - HEADER_HEIGHT + 5 * mm, BRAND_TEXT)
+    canvas.setFont('Vera', 10)
+    canvas.drawString(width - MARGIN - _HEADER_TEXT_WIDTH, height - HEADER_HEIGHT + 5 * mm, HEADER_TEXT)
+    canvas.setStrokeColor(colors.lightgrey)
+    canvas.setLineWidth(0.5)
+    canvas.line(MARGIN, 15 * mm, width - MARGIN, 15 * mm)
+    canvas.setFillColor(colors.grey)
+    canvas.setFont('Vera-Italic', 7)
+    canvas.drawString(MARGIN, 10 * mm, FOOTER_TEXT)
+
+def on_page(canvas, doc):
+    # The form is defined on the first page and referenced from every page after it
+    if not getattr(doc, 'furniture_ready', False):
+        canvas.beginForm(FURNITURE_FORM)
+        draw_furniture(canvas)
+        canvas.endForm()
+        doc.furniture_ready = True
+    canvas.saveState()
+    canvas.doForm(FURNITURE_FORM)
+    canvas.setFillColor(colors.grey)
+    canvas.setFont('Vera', 8)
+    canvas.drawRightString(PAGE_SIZE[0] - MARGIN, 10 * mm, f'Page {doc.page}')
+    canvas.restoreState()
+
+# =======================|| Report content ||========================
+
+def _paragraph(text, style='body'):
+    return Paragraph(escape(str(text)), STYLES[style])
+
+def build_story(request):
+    """Flowables for the sections present in `request` (recovery, diet, postureIds)."""
+    story = [
+        _paragraph(wellness_report.report_title(request), 'title'),
+        _paragraph(wellness_report.generated_line(), 'subtitle'),
+    ]
+    for heading, entries in wellness_report.report_sections(request):
+        story.append(_paragraph(heading, 'heading'))
+        for label, text in entries:
+            if label is None:
+                story.append(_paragraph(text))
+            else:
+                story.append(KeepTogether([_paragraph(label, 'label'), _paragraph(text)]))
+    story.append(Spacer(1, 4 * mm))
+    return story
+
+def render_pdf(request, output=None):
+    """Render the report into `output` (any writable binary file); returns the BytesIO used if none is given."""
+    output = output if output is not None else io.BytesIO()
+    doc = SimpleDocTemplate(
+        output, pagesize=PAGE_SIZE,
+        leftMargin=MARGIN, rightMargin=MARGIN, topMargin=HEADER_HEIGHT + 10 * mm, bottomMargin=25 * mm,
+        title='Wellness Report', author=BRAND_TEXT
+    )
+    doc.build(build_story(request), onFirstPage=on_page, onLaterPages=on_page)
+    return output
+
+@metrics.timed('POST /report/pdf')
+def lambda_handler(event, context):
+    try:
+        request = json.loads(event.get('body') or '{}')
+        invalid = wellness_report.validation_error(request)
+        if invalid:
+            return invalid
+
+        with metrics.phase('render') as render:
+            buffer = render_pdf(request)
+        log.info("Rendered report", bytes=buffer.tell(), renderMs=round(render.elapsed_ms, 1))
+        with metrics.phase('deliver'):
+            return wellness_report.deliver(request, buffer, 'pdf', PDF_HEADERS)
+
+    except Exception as e:
+        log.exception("Error rendering report: %s", e)
+        return json_response(500, {'error': str(e)})
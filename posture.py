@@ -1,57 +1,133 @@
-import json
-import boto3
+import os
 from boto3.dynamodb.conditions import Key
 
-# Initialize the DynamoDB resource
-dynamodb = boto3.resource('dynamodb')
+import aws_clients
+from api_response import json_response
+import fanout
+import metrics
+import structured_log
+from ttl_cache import MISSING, TTLCache
+
+log = structured_log.get_logger(__name__)
+
 TABLE_NAME = 'posturereport'  # Your DynamoDB table name
 
+# Posture reports are static reference content, so warm containers keep them in memory.
+# Unknown IDs are cached as None for a shorter time so repeated 404s skip DynamoDB too.
+POSTURE_CACHE_SIZE = int(os.environ.get('POSTURE_CACHE_SIZE', '256'))
+POSTURE_CACHE_TTL = float(os.environ.get('POSTURE_CACHE_TTL', '3600'))
+POSTURE_NEGATIVE_TTL = float(os.environ.get('POSTURE_NEGATIVE_TTL', '300'))
+
+_report_cache = TTLCache(maxsize=POSTURE_CACHE_SIZE, ttl=POSTURE_CACHE_TTL)
+_table_reads = 0
+
+def cache_report(posture_id, report):
+    _report_cache.put(posture_id, report, ttl=POSTURE_NEGATIVE_TTL if report is None else None)
+
+def posture_cache_stats():
+    """Cache hit/miss counters plus how many DynamoDB reads this container has made."""
+    stats = _report_cache.stats()
+    stats['table_reads'] = _table_reads
+    return stats
+
+# The same counts go out as the PostureCache metric (Event=hit|miss|tableRead), so
+# CloudWatch shows whether warm invocations are served without touching the table
+def _cached_report(posture_id):
+    cached = _report_cache.get(posture_id)
+    metrics.record('PostureCache', 1, unit='Count', Event='miss' if cached is MISSING else 'hit')
+    return cached
+
+def _count_table_reads(count):
+    global _table_reads
+    _table_reads += count
+    metrics.record('PostureCache', count, unit='Count', Event='tableRead')
+
+def preload_posture_reports():
+    """Scan the whole posture table into the cache. Returns the number of reports loaded."""
+    table = aws_clients.get_table(TABLE_NAME)
+    scan_kwargs = {'ProjectionExpression': 'posture_id, report'}
+    count = 0
+
+    while True:
+        response = table.scan(**scan_kwargs)
+        _count_table_reads(1)
+        for item in response.get('Items', []):
+            if 'report' in item:
+                cache_report(item['posture_id'], item['report'])
+                count += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return count
+
 def get_posture_report(posture_id):
-    table = dynamodb.Table(TABLE_NAME)
+    cached = _cached_report(posture_id)
+    if cached is not MISSING:
+        return cached
+
+    table = aws_clients.get_table(TABLE_NAME)
 
     # Query the DynamoDB table for the selected posture report
     response = table.query(
         KeyConditionExpression=Key('posture_id').eq(posture_id)
     )
+    _count_table_reads(1)
 
     # Assuming the report is in the 'report' attribute
     if 'Items' in response and len(response['Items']) > 0:
-        return response['Items'][0]['report']
+        report = response['Items'][0]['report']
     else:
-        return None
+        report = None
+
+    cache_report(posture_id, report)
+    return report
 
+def get_posture_reports(posture_ids):
+    """Fetch several posture reports, querying cache misses concurrently. Returns {posture_id: report or None}."""
+    reports = {}
+    missing = []
+    for posture_id in posture_ids:
+        cached = _cached_report(posture_id)
+        if cached is MISSING:
+            missing.append(posture_id)
+        else:
+            reports[posture_id] = cached
+
+    results = fanout.gather(
+        [(fanout.query_items, TABLE_NAME, 'posture_id', posture_id, 1) for posture_id in missing],
+        return_exceptions=True
+    )
+    if missing:
+        _count_table_reads(len(missing))
+
+    for posture_id, items in zip(missing, results):
+        if isinstance(items, Exception):
+            # Don't cache failures; the next request should try again
+            reports[posture_id] = None
+            continue
+        reports[posture_id] = items[0].get('report') if items else None
+        cache_report(posture_id, reports[posture_id])
+    return reports
+
+@metrics.timed('GET /posture/{postureId}')
 def lambda_handler(event, context):
     try:
         posture_id = event['pathParameters']['postureId']
     except KeyError:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # Enable CORS
-            },
-            'body': json.dumps({'error': 'Missing posture ID'})
-        }
+        return json_response(400, {'error': 'Missing posture ID'})
 
     # Get the posture report from DynamoDB
     report = get_posture_report(posture_id)
 
     if not report:
-        return {
-            'statusCode': 404,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # Enable CORS
-            },
-            'body': json.dumps({'error': 'Posture report not found'})
-        }
+        return json_response(404, {'error': 'Posture report not found'})
 
     # Return the report as a response
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',  # Enable CORS
-        },
-        'body': json.dumps({'report': report})
-    }
+    return json_response(200, {'report': report})
+
+# Optionally warm the cache with every report during init
+if os.environ.get('POSTURE_PRELOAD', '').lower() == 'true':
+    try:
+        preload_posture_reports()
+    except Exception as e:
+        log.exception("Error preloading posture reports: %s", e)
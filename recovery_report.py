@@ -1,43 +1,79 @@
 import json
+from bisect import bisect_right
+
+import metrics
+import structured_log
+from api_response import json_response
+
+log = structured_log.get_logger(__name__)
+
+# Largest number of users accepted by a single batch request (keeps responses under 6 MB)
+MAX_BATCH_USERS = 5000
+
+# Feedback rules per metric, in report order. Each band is (op, bound, message): the first
+# band whose `value < bound` ("lt") or `value <= bound` ("le") holds wins, and the final
+# band (bound None) catches everything above. Adding a metric means adding a row here.
+RECOVERY_RULES = (
+    ("sleep", (
+        ("lt", 7, "You should try to sleep more. Aim for at least 7-8 hours of sleep per night."),
+        ("le", 9, "Your sleep duration is perfect. Keep maintaining 7-9 hours of sleep per night."),
+        (None, None, "You are sleeping a lot! Make sure that long sleep doesn’t leave you feeling sluggish."),
+    )),
+    ("workoutRecovery", (
+        ("lt", 30, "Consider spending more time on workout recovery. 30-60 minutes of post-workout recovery is ideal."),
+        (None, None, "You are spending enough time on workout recovery. Great job!"),
+    )),
+    ("relaxation", (
+        ("lt", 30, "Try to spend at least 30 minutes a day on relaxation or meditation to reduce stress."),
+        (None, None, "Your relaxation time is sufficient. Keep it up to maintain good mental health!"),
+    )),
+)
+
+def compile_rules(rules):
+    """Turn RECOVERY_RULES into [(metric, boundaries, messages)] for bisect lookups.
+
+    A boundary is (bound, 0) for "lt" and (bound, 1) for "le"; looking up (value, 0.5)
+    with bisect_right then lands on the right band for either kind of comparison.
+    """
+    compiled = []
+    for metric, bands in rules:
+        boundaries = [(bound, 0 if op == "lt" else 1) for op, bound, _ in bands[:-1]]
+        messages = [message + "\n" for _, _, message in bands]
+        compiled.append((metric, boundaries, messages))
+    return compiled
+
+_compiled_rules = compile_rules(RECOVERY_RULES)
+
+def evaluate_metrics(values):
+    """Feedback for every rule metric present in `values`, joined in rule order."""
+    return "".join([
+        messages[bisect_right(boundaries, (values[metric], 0.5))]
+        for metric, boundaries, messages in _compiled_rules
+        if metric in values
+    ])
 
 # Function to generate personalized feedback based on sleep, workout recovery, and relaxation
 def generate_personalized_report(sleep, workoutRecovery, relaxation):
-    feedback = ""
-
-    # Sleep feedback
-    if sleep < 7:
-        feedback += "You should try to sleep more. Aim for at least 7-8 hours of sleep per night.\n"
-    elif sleep > 9:
-        feedback += "You are sleeping a lot! Make sure that long sleep doesn’t leave you feeling sluggish.\n"
-    else:
-        feedback += "Your sleep duration is perfect. Keep maintaining 7-9 hours of sleep per night.\n"
-
-    # Workout recovery feedback
-    if workoutRecovery < 30:
-        feedback += "Consider spending more time on workout recovery. 30-60 minutes of post-workout recovery is ideal.\n"
-    else:
-        feedback += "You are spending enough time on workout recovery. Great job!\n"
-
-    # Relaxation feedback
-    if relaxation < 30:
-        feedback += "Try to spend at least 30 minutes a day on relaxation or meditation to reduce stress.\n"
-    else:
-        feedback += "Your relaxation time is sufficient. Keep it up to maintain good mental health!\n"
-
-    return feedback
+    return evaluate_metrics({"sleep": sleep, "workoutRecovery": workoutRecovery, "relaxation": relaxation})
 
-def lambda_handler(event, context):
-    # Parse the request body
-    body = json.loads(event['body'])
-    sleep = body.get('sleep', 0)
-    workoutRecovery = body.get('workoutRecovery', 0)
-    relaxation = body.get('relaxation', 0)
+def generate_personalized_reports(users):
+    """Feedback for many users at once; each user is a dict of metric values."""
+    return [evaluate_metrics(values) for values in users]
 
-    # Generate the personalized feedback
-    personalized_feedback = generate_personalized_report(sleep, workoutRecovery, relaxation)
+def read_metrics(user):
+    """{metric: number} for one user's input (missing metrics count as 0), or None if it is malformed."""
+    if not isinstance(user, dict):
+        return None
+    values = {metric: user.get(metric, 0) for metric, _ in RECOVERY_RULES}
+    for value in values.values():
+        # bool is an int subclass; NaN would compare false against every band
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+            return None
+    return values
 
-    # Generate a recovery report based on the input data and personalized feedback
-    report = {
+def build_report(sleep, workoutRecovery, relaxation, personalized_feedback):
+    """Generate a recovery report based on the input data and personalized feedback."""
+    return {
         "message": "Your Recovery Report",
         "data": {
             "sleep": f"You slept for {sleep} hours.",
@@ -47,12 +83,41 @@ def lambda_handler(event, context):
         }
     }
 
-    # Return the report in JSON format
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(report)
-    }
+@metrics.timed('POST /recovery-report')
+def lambda_handler(event, context):
+    try:
+        # Parse the request body
+        body = json.loads(event['body'])
+
+        # Batch mode: {"users": [{"sleep": ..., "workoutRecovery": ..., "relaxation": ...}, ...]}
+        if isinstance(body, dict) and isinstance(body.get('users'), list):
+            if len(body['users']) > MAX_BATCH_USERS:
+                return json_response(400, {"error": f"Invalid input: at most {MAX_BATCH_USERS} users per request"})
+            users = [read_metrics(user) for user in body['users']]
+            if None in users:
+                return json_response(400, {
+                    "error": "Invalid input: every user must be an object of numeric sleep, workoutRecovery and relaxation",
+                    "index": users.index(None)
+                })
+            feedback = generate_personalized_reports(users)
+            reports = [
+                build_report(user["sleep"], user["workoutRecovery"], user["relaxation"], personalized_feedback)
+                for user, personalized_feedback in zip(users, feedback)
+            ]
+            return json_response(200, {"reports": reports})
+
+        values = read_metrics(body)
+        if values is None:
+            return json_response(400, {"error": "Invalid input: sleep, workoutRecovery and relaxation must be numbers"})
+        sleep, workoutRecovery, relaxation = values["sleep"], values["workoutRecovery"], values["relaxation"]
+
+        # Generate the personalized feedback
+        personalized_feedback = generate_personalized_report(sleep, workoutRecovery, relaxation)
+        report = build_report(sleep, workoutRecovery, relaxation, personalized_feedback)
+
+        # Return the report in JSON format
+        return json_response(200, report)
+
+    except Exception as e:
+        log.exception("Error building recovery report: %s", e)
+        return json_response(500, {"error": str(e)})
@@ -0,0 +1,112 @@
+"""Single entry point that dispatches API Gateway events to the existing handlers.
+
+Deploying this one function in front of every route means all traffic shares
+one warm pool instead of seven mostly-cold ones. Handler modules are imported
+the first time one of their routes is hit, so a cold start only pays for the
+route being served, and the per-module caches (questions, diet, posture, ...)
+stay warm for every later request in the container.
+"""
+import importlib
+import os
+import re
+from types import MappingProxyType
+
+from api_response import json_response, raw_response
+
+# (method, path template, "module.function"); keep in sync with serverless.yml
+ROUTES = (
+    ('POST', '/subscribe', 'handler.subscribe_user'),
+    # /subscribe/import and its status route need an API key, so they are only served by their
+    # own `private: true` endpoints and are deliberately not routed here
+    ('POST', '/register', 'handler.register_user'),
+    ('POST', '/login', 'handler.login_user'),
+    ('GET', '/questions', 'trainques.fetch_questions'),
+    ('POST', '/questions/score', 'scoring.score_answers'),
+    ('GET', '/posture/{postureId}', 'posture.lambda_handler'),
+    ('POST', '/diet', 'diet.lambda_handler'),
+    ('POST', '/bmi', 'bmi.lambda_handler'),
+    ('POST', '/bmi/batch', 'bmi.lambda_batch_handler'),
+    ('POST', '/recovery-report', 'recovery_report.lambda_handler'),
+    ('POST', '/report/pdf', 'pdf_report.lambda_handler'),
+    ('POST', '/report/docx', 'docx_report.lambda_handler'),
+)
+
+# Prefix the router is mounted under (e.g. "/api" for the api/{proxy+} route)
+BASE_PATH = os.environ.get('ROUTER_BASE_PATH', '/api').rstrip('/')
+
+CORS_HEADERS = MappingProxyType({
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+})
+_ERROR_HEADERS = MappingProxyType(dict(CORS_HEADERS, **{'Content-Type': 'application/json'}))
+
+_PARAM_RE = re.compile(r'\{(\w+)\}')
+
+def compile_routes(routes):
+    """Turn path templates into anchored regexes with named groups for path parameters."""
+    compiled = []
+    for method, template, target in routes:
+        parts = _PARAM_RE.split(template)
+        pattern = ''.join(
+            re.escape(part) if i % 2 == 0 else f'(?P<{part}>[^/]+)'
+            for i, part in enumerate(parts)
+        )
+        compiled.append((method, re.compile(f'^{pattern}$'), target))
+    return compiled
+
+_routes = compile_routes(ROUTES)
+
+# "module.function" -> handler function, filled in on first use
+_handlers = {}
+
+def resolve(target):
+    """Import a handler's module the first time the handler is needed."""
+    handler = _handlers.get(target)
+    if handler is None:
+        module_name, function_name = target.rsplit('.', 1)
+        handler = getattr(importlib.import_module(module_name), function_name)
+        _handlers[target] = handler
+    return handler
+
+def request_line(event):
+    """Return (method, path) for REST (v1) and HTTP (v2) API Gateway events."""
+    http = (event.get('requestContext') or {}).get('http') or {}
+    method = (event.get('httpMethod') or http.get('method') or '').upper()
+    path = event.get('path') or event.get('rawPath') or '/'
+
+    stage = (event.get('requestContext') or {}).get('stage')
+    if stage and stage != '$default' and path.startswith(f'/{stage}/'):
+        path = path[len(stage) + 1:]
+    if BASE_PATH and (path == BASE_PATH or path.startswith(BASE_PATH + '/')):
+        path = path[len(BASE_PATH):] or '/'
+    return method, path.rstrip('/') or '/'
+
+def match(method, path):
+    """Return (target, path_parameters), or (None, allowed_methods) if nothing matches."""
+    allowed = []
+    for route_method, pattern, target in _routes:
+        found = pattern.match(path)
+        if found:
+            if route_method == method:
+                return target, found.groupdict()
+            allowed.append(route_method)
+    return None, allowed
+
+def route(event, context):
+    method, path = request_line(event)
+
+    if method == 'OPTIONS':
+        return raw_response(200, '', CORS_HEADERS)
+
+    target, params = match(method, path)
+    if target is None:
+        return json_response(
+            405 if params else 404,
+            {'error': 'Method not allowed' if params else 'Not found'},
+            _ERROR_HEADERS
+        )
+
+    if params:
+        event = dict(event, pathParameters=dict(event.get('pathParameters') or {}, **params))
+    return resolve(target)(event, context)
@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+
+import metrics
+import structured_log
+from api_response import json_response
+
+log = structured_log.get_logger(__name__)
+
+# The same CSV dyna.py loads into QuestionsTable; it is the only source that keeps the Rating column
+QUESTIONS_CSV = os.environ.get(
+    'QUESTIONS_CSV_PATH',
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        'Updated_Relationship_Questions_and_Feedback_with_Second_Person_Narration.csv'
+    )
+)
+
+MIN_RATING = 1
+MAX_RATING = 5
+
+# (relationship type, question, rating), normalized -> (canonical type, feedback narrative), built once per container
+_feedback_index = None
+
+def normalize(text):
+    """Case- and whitespace-insensitive key for relationship types and question text."""
+    return ' '.join(str(text).split()).lower()
+
+def build_index(path=QUESTIONS_CSV):
+    """Read the questions CSV into a {(type, question, rating): (type, feedback)} dict."""
+    index = {}
+    with open(path, newline='', encoding='utf-8-sig') as csvfile:
+        for row in csv.DictReader(csvfile):
+            key = (normalize(row['Relationship Type']), normalize(row['Question']), int(row['Rating']))
+            index[key] = (row['Relationship Type'].strip(), row['Final out put'].strip())
+    return index
+
+def get_index():
+    global _feedback_index
+    if _feedback_index is None:
+        _feedback_index = build_index()
+    return _feedback_index
+
+def dyadic_health_score(average_rating):
+    """Map an average 1-5 rating onto a 0-100 score."""
+    return round((average_rating - MIN_RATING) / (MAX_RATING - MIN_RATING) * 100, 1)
+
+def valid_rating(rating):
+    """True for a whole-number rating on the 1-5 scale; 1.9, "3" and true are rejected, not coerced."""
+    return type(rating) is int and MIN_RATING <= rating <= MAX_RATING
+
+def score_answer_sheet(answers):
+    """Resolve every answer to its feedback and aggregate scores per relationship type."""
+    index = get_index()
+    feedback = []
+    unmatched = []
+    totals = {}
+
+    for position, answer in enumerate(answers):
+        if not isinstance(answer, dict):
+            unmatched.append(position)
+            continue
+
+        relationship_type = answer.get('relationshipType')
+        question = answer.get('question')
+        rating = answer.get('rating')
+
+        match = None
+        if isinstance(relationship_type, str) and isinstance(question, str) and valid_rating(rating):
+            match = index.get((normalize(relationship_type), normalize(question), rating))
+        if match is None:
+            unmatched.append(position)
+            continue
+
+        relationship_type, narrative = match
+
+        feedback.append({
+            'relationshipType': relationship_type,
+            'question': question,
+            'rating': rating,
+            'feedback': narrative
+        })
+        count, total = totals.get(relationship_type, (0, 0))
+        totals[relationship_type] = (count + 1, total + rating)
+
+    scores = {}
+    for relationship_type, (count, total) in totals.items():
+        average = total / count
+        scores[relationship_type] = {
+            'answered': count,
+            'averageRating': round(average, 2),
+            'score': dyadic_health_score(average)
+        }
+
+    return {'feedback': feedback, 'scores': scores, 'unmatched': unmatched}
+
+@metrics.timed('POST /questions/score')
+def score_answers(event, context):
+    try:
+        body = json.loads(event['body'])
+        answers = body.get('answers') if isinstance(body, dict) else None
+
+        if not isinstance(answers, list) or not answers:
+            return json_response(400, {'error': 'answers must be a non-empty list'})
+
+        return json_response(200, score_answer_sheet(answers))
+
+    except Exception as e:
+        log.exception("Error scoring answers: %s", e)
+        return json_response(500, {'error': str(e)})
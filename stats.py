@@ -0,0 +1,8 @@
+def percentile(sorted_values, p):
+    """Linear-interpolated percentile of an already sorted list (matches numpy's default); 0.0 if empty."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
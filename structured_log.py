@@ -0,0 +1,211 @@
+"""JSON-lines logging shared by the handlers.
+
+Every record is written to stdout as one JSON object, which CloudWatch Logs
+Insights can query field by field. Records carry the route and request ID of
+the invocation that wrote them.
+
+Logging costs next to nothing when it is off:
+- a disabled level returns before a record, a message or a fields dict is
+  formatted;
+- structured fields (`log.debug('Received event', event=event)`) and %-style
+  arguments are only serialized when the record is actually written, so a
+  whole event is never dumped on a warm path that nobody reads.
+
+Configuration comes from the environment:
+    LOG_LEVEL          threshold for every module (default INFO)
+    LOG_LEVELS         per-module overrides, e.g. "bmi=DEBUG,outbox=WARNING"
+    LOG_SAMPLE_RATE    fraction of invocations whose DEBUG/INFO records are kept (default 1)
+    LOG_SAMPLE_RATES   per-route overrides, e.g. "POST /bmi=0.05,GET /questions=0.01"
+Sampling is decided once per invocation, so a sampled request keeps all of its
+records. Warnings and errors are never sampled out. A setting that cannot be
+parsed falls back to INFO or 1 and is reported as a warning, never an import error.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT_LOGGER = 'dyadic'
+
+# Problems found in the settings below, logged once logging is configured
+_config_warnings = []
+
+def parse_level(value, setting):
+    """Level name for `value`, or INFO (with a warning) if it is not one."""
+    level = value.strip().upper()
+    if isinstance(logging.getLevelName(level), int):
+        return level
+    _config_warnings.append(f"Ignoring {setting}={value!r}: not a log level; using INFO")
+    return 'INFO'
+
+def parse_rate(value, setting):
+    """Sample rate between 0 and 1 for `value`, or 1 (with a warning) if it is not one."""
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = None
+    # Written so that NaN fails the check too
+    if rate is not None and 0 <= rate <= 1:
+        return rate
+    _config_warnings.append(f"Ignoring {setting}={value!r}: not a number between 0 and 1; using 1")
+    return 1.0
+
+def parse_pairs(spec, convert, setting):
+    """Parse "key=value,key=value" into a dict; entries without '=' are ignored."""
+    pairs = {}
+    for entry in spec.split(','):
+        key, sep, value = entry.rpartition('=')
+        if sep and key.strip():
+            pairs[key.strip()] = convert(value.strip(), f"{setting}[{key.strip()}]")
+    return pairs
+
+LOG_LEVEL = parse_level(os.environ.get('LOG_LEVEL', 'INFO'), 'LOG_LEVEL')
+LOG_LEVELS = parse_pairs(os.environ.get('LOG_LEVELS', ''), parse_level, 'LOG_LEVELS')
+LOG_SAMPLE_RATE = parse_rate(os.environ.get('LOG_SAMPLE_RATE', '1'), 'LOG_SAMPLE_RATE')
+LOG_SAMPLE_RATES = parse_pairs(os.environ.get('LOG_SAMPLE_RATES', ''), parse_rate, 'LOG_SAMPLE_RATES')
+
+# The invocation being served: {'route', 'requestId', 'sampled'}, or None outside a handler
+_invocation = contextvars.ContextVar('invocation', default=None)
+_cold_start = True
+
+# =======================|| Output ||========================
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one compact JSON line.
+
+    Structured fields are top-level keys, except ones named like a standard key
+    (message, level, ...), which go under "fields" instead of replacing it.
+    """
+
+    RESERVED = frozenset(('timestamp', 'level', 'logger', 'message', 'route', 'requestId', 'exception', 'fields'))
+
+    def format(self, record):
+        entry = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name[len(ROOT_LOGGER) + 1:] or record.name,
+            'message': record.getMessage(),
+        }
+        invocation = getattr(record, 'invocation', None)
+        if invocation:
+            entry['route'] = invocation['route']
+            if invocation['requestId']:
+                entry['requestId'] = invocation['requestId']
+        fields = getattr(record, 'fields', None)
+        if fields:
+            if self.RESERVED.isdisjoint(fields):
+                entry.update(fields)
+            else:
+                entry.update((k, v) for k, v in fields.items() if k not in self.RESERVED)
+                entry['fields'] = {k: v for k, v in fields.items() if k in self.RESERVED}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        # str() covers Decimal, datetime and anything else a handler passes along
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+def configure(level=LOG_LEVEL, levels=LOG_LEVELS, stream=None):
+    """Send every logger under ROOT_LOGGER to `stream` (stdout) as JSON lines."""
+    root = logging.getLogger(ROOT_LOGGER)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    # The Lambda runtime puts its own handler on the root logger; don't log twice
+    root.propagate = False
+    for name, module_level in levels.items():
+        logging.getLogger(f'{ROOT_LOGGER}.{name}').setLevel(module_level)
+
+configure()
+
+# =======================|| Loggers ||========================
+
+class StructuredLogger:
+    """Thin wrapper over a stdlib logger that takes structured fields as keyword arguments."""
+
+    __slots__ = ('_logger',)
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+    def is_enabled(self, level):
+        """True if a record at `level` would be written for the current invocation."""
+        if level < logging.WARNING:
+            invocation = _invocation.get()
+            if invocation is not None and not invocation['sampled']:
+                return False
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, msg, args, fields, exc_info=None):
+        self._logger.log(
+            level, msg, *args,
+            exc_info=exc_info,
+            extra={'fields': fields, 'invocation': _invocation.get()},
+            stacklevel=3
+        )
+
+    def debug(self, msg, *args, **fields):
+        if self.is_enabled(logging.DEBUG):
+            self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        if self.is_enabled(logging.INFO):
+            self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, fields)
+
+    def exception(self, msg, *args, **fields):
+        """Log at ERROR with the traceback of the exception being handled."""
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, fields, exc_info=True)
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+for _warning in _config_warnings:
+    get_logger(__name__).warning(_warning)
+
+# =======================|| Invocation context ||========================
+
+def sample_rate(route):
+    return LOG_SAMPLE_RATES.get(route, LOG_SAMPLE_RATE)
+
+def logged(route):
+    """Decorate a Lambda handler so its records carry `route` and the request ID.
+
+    Also makes the sampling decision for the invocation and writes one DEBUG
+    record on the container's first invocation.
+    """
+    rate = sample_rate(route)
+
+    def decorate(handler):
+        log = get_logger(handler.__module__)
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _cold_start
+            token = _invocation.set({
+                'route': route,
+                'requestId': getattr(context, 'aws_request_id', None),
+                'sampled': rate >= 1 or random.random() < rate
+            })
+            try:
+                if _cold_start:
+                    _cold_start = False
+                    log.debug('Cold start')
+                return handler(event, context)
+            finally:
+                _invocation.reset(token)
+        return wrapper
+    return decorate
@@ -0,0 +1,45 @@
+"""docx_report builds documents from python-docx internals (pinned in requirements.txt).
+
+These render through the cached template and reopen the result with the public
+python-docx API, so a python-docx upgrade that changes those internals fails here
+instead of in production.
+"""
+import io
+import os
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docx  # noqa: E402
+
+import docx_report  # noqa: E402
+
+REQUEST = {'name': 'Sam', 'recovery': {'sleep': 7, 'workoutRecovery': 30, 'relaxation': 20}}
+
+def reopen(buffer):
+    buffer.seek(0)
+    return docx.Document(io.BytesIO(buffer.getvalue()))
+
+def test_rendered_report_reopens_with_title_and_sections():
+    document = reopen(docx_report.render_docx(REQUEST))
+    paragraphs = [(p.style.name, p.text) for p in document.paragraphs if p.text]
+
+    assert paragraphs[0] == ('Title', 'Wellness report for Sam')
+    assert ('Heading 1', 'Recovery') in paragraphs
+    assert len(paragraphs) > 3
+
+def test_reports_do_not_share_content():
+    docx_report.render_docx(REQUEST)
+    document = reopen(docx_report.render_docx({'name': 'Alex', 'recovery': {'sleep': 8}}))
+    texts = [p.text for p in document.paragraphs]
+
+    assert 'Wellness report for Alex' in texts
+    assert 'Wellness report for Sam' not in texts
+
+def test_template_parts_survive_the_round_trip():
+    template = docx.Document(docx_report.DOCX_TEMPLATE_PATH)
+    document = reopen(docx_report.render_docx(REQUEST))
+
+    assert sorted(str(part.partname) for part in document.part.package.parts) == \
+        sorted(str(part.partname) for part in template.part.package.parts)
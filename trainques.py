@@ -1,72 +1,155 @@
+import base64
 import json
-import boto3
+import os
+import time
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
-from decimal import Decimal
-
-# Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
-table = dynamodb.Table('QuestionsTable')  # Updated table name
-
-def decimal_to_native_type(obj):
-    """Convert DynamoDB Decimal types to native Python types."""
-    if isinstance(obj, list):
-        return [decimal_to_native_type(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: decimal_to_native_type(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj) if obj % 1 else int(obj)
-    return obj
 
+import aws_clients
+import metrics
+import structured_log
+from api_response import encode, json_response, raw_response
+
+log = structured_log.get_logger(__name__)
+
+TABLE_NAME = 'QuestionsTable'  # Updated table name
+TABLE_REGION = 'us-west-2'
+
+# Warm-container cache of encoded question lists, keyed by relationship type.
+# Entries expire after QUESTIONS_CACHE_TTL seconds or when QUESTIONS_CACHE_VERSION changes.
+QUESTIONS_CACHE_TTL = float(os.environ.get('QUESTIONS_CACHE_TTL', '300'))
+_questions_cache = {}
+
+def questions_cache_version():
+    """Return the catalog version the cache is currently valid for."""
+    return os.environ.get('QUESTIONS_CACHE_VERSION', '1')
+
+def get_cached_questions(relationship_type):
+    """Return the cached JSON body for a relationship type, or None if missing or stale."""
+    entry = _questions_cache.get(relationship_type)
+    if entry is None:
+        return None
+
+    body, version, expires_at = entry
+    if version != questions_cache_version() or time.monotonic() >= expires_at:
+        _questions_cache.pop(relationship_type, None)
+        return None
+    return body
+
+def cache_questions(relationship_type, body):
+    """Store an already-encoded JSON body for a relationship type."""
+    _questions_cache[relationship_type] = (
+        body,
+        questions_cache_version(),
+        time.monotonic() + QUESTIONS_CACHE_TTL
+    )
+
+def invalidate_questions_cache(relationship_type=None):
+    """Drop one relationship type from the cache, or everything when no type is given."""
+    if relationship_type is None:
+        _questions_cache.clear()
+    else:
+        _questions_cache.pop(relationship_type, None)
+
+# Upper bound for the `limit` query parameter in paginated mode
+MAX_PAGE_SIZE = 100
+
+def iter_question_pages(relationship_type, limit=None, start_key=None):
+    """Yield (items, last_evaluated_key) pages, following LastEvaluatedKey until exhausted."""
+    query_kwargs = {
+        'KeyConditionExpression': Key('RelationshipType').eq(relationship_type)
+    }
+    if limit:
+        query_kwargs['Limit'] = limit
+
+    while True:
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        response = aws_clients.get_table(TABLE_NAME, TABLE_REGION).query(**query_kwargs)
+        start_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), start_key
+        if not start_key:
+            return
+
+def iter_encoded_questions(pages):
+    """Encode question pages as a JSON array, one item at a time."""
+    yield '['
+    first = True
+    for items, _ in pages:
+        for item in items:
+            if not first:
+                yield ', '
+            first = False
+            yield encode(item)
+    yield ']'
+
+def encode_cursor(last_evaluated_key):
+    """Turn a LastEvaluatedKey into an opaque URL-safe cursor."""
+    if not last_evaluated_key:
+        return None
+    raw = encode(last_evaluated_key).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Turn a cursor back into an ExclusiveStartKey. Raises ValueError if it is malformed."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, dict):
+        raise ValueError('Invalid cursor')
+    return key
+
+def fetch_question_page(relationship_type, limit, cursor=None):
+    """Return one page of questions and the cursor for the next one."""
+    start_key = decode_cursor(cursor) if cursor else None
+    items, last_key = next(iter_question_pages(relationship_type, limit, start_key))
+    return {
+        'items': items,
+        'nextCursor': encode_cursor(last_key)
+    }
+
+@metrics.timed('GET /questions')
 def fetch_questions(event, context):
     try:
         # Extract the relationship type from query string parameters
-        query_params = event.get('queryStringParameters', {})
+        query_params = event.get('queryStringParameters') or {}
         relationship_type = query_params.get('relationshipType', None)
         
         if not relationship_type:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Missing relationshipType query parameter'}),
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*',  # Enable CORS
-                }
-            }
-
-        # Query DynamoDB to get questions based on the relationshipType
-        response = table.query(
-            KeyConditionExpression=Key('RelationshipType').eq(relationship_type)
-        )
-        
-        items = response.get('Items', [])
-        native_items = decimal_to_native_type(items)
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps(native_items),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # Enable CORS
-            }
-        }
+            return json_response(400, {'error': 'Missing relationshipType query parameter'})
+
+        # Paginated mode: one page per request, resumed through an opaque cursor
+        limit = query_params.get('limit')
+        cursor = query_params.get('cursor')
+        if limit or cursor:
+            try:
+                limit = int(limit) if limit else MAX_PAGE_SIZE
+            except ValueError:
+                limit = 0
+            try:
+                if not 1 <= limit <= MAX_PAGE_SIZE:
+                    raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+                page = fetch_question_page(relationship_type, limit, cursor)
+            except ValueError as e:
+                return json_response(400, {'error': str(e)})
+
+            return json_response(200, page)
+
+        # Serve warm invocations straight from the pre-encoded cache
+        body = get_cached_questions(relationship_type)
+        if body is None:
+            # Query every page for the relationshipType and encode items as they arrive
+            pages = iter_question_pages(relationship_type)
+            body = ''.join(iter_encoded_questions(pages))
+            cache_questions(relationship_type, body)
+
+        return raw_response(200, body)
 
     except ClientError as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': e.response['Error']['Message']}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # Enable CORS
-            }
-        }
+        log.exception("Error fetching questions: %s", e)
+        return json_response(500, {'error': e.response['Error']['Message']})
 
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)}),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',  # Enable CORS
-            }
-        }
+        log.exception("Error fetching questions: %s", e)
+        return json_response(500, {'error': str(e)})
@@ -0,0 +1,135 @@
+"""Content and delivery shared by the PDF (pdf_report) and Word (docx_report) wellness reports."""
+import base64
+import os
+import uuid
+from datetime import datetime
+
+import aws_clients
+import diet
+import fanout
+import posture
+import recovery_report
+from api_response import json_response, raw_response
+
+# Bucket for reports that are too large to return inline, or that were requested via S3
+REPORTS_BUCKET = os.environ.get('REPORTS_BUCKET', 'dyadic-wellness-reports')
+PRESIGNED_URL_SECONDS = 900
+
+# API Gateway rejects Lambda responses over 6 MB; base64 adds a third
+MAX_INLINE_BYTES = 4 * 1024 * 1024
+
+SECTIONS = ('recovery', 'diet', 'postureIds')
+
+# Each posture ID is a separate lookup, so a report covers at most this many
+MAX_POSTURE_IDS = 20
+
+DIET_LABELS = {
+    'vegetables': 'Vegetables',
+    'protein': 'Protein',
+    'grains': 'Grains',
+    'nutsSeeds': 'Nuts and seeds',
+    'dairy': 'Dairy',
+    'fruits': 'Fruits',
+}
+
+def report_title(request):
+    name = request.get('name')
+    return f"Wellness report for {name}" if name else 'Your wellness report'
+
+def generated_line():
+    return f"Generated {datetime.utcnow():%B %d, %Y}"
+
+def recovery_section(metrics):
+    sleep = metrics.get('sleep', 0)
+    workout_recovery = metrics.get('workoutRecovery', 0)
+    relaxation = metrics.get('relaxation', 0)
+    feedback = recovery_report.generate_personalized_report(sleep, workout_recovery, relaxation)
+    data = recovery_report.build_report(sleep, workout_recovery, relaxation, feedback)['data']
+    return 'Recovery', [
+        (None, data['sleep']),
+        (None, data['workoutRecovery']),
+        (None, data['relaxation']),
+        (None, data['personalizedFeedback']),
+    ]
+
+def diet_section(intake):
+    recommendations = diet.get_recommendations(intake)
+    return 'Diet', [
+        (
+            f"{DIET_LABELS[group]}: {intake.get(group, 0)} of {diet.RECOMMENDED_VALUES[group]} "
+            f"recommended daily servings",
+            recommendations[group]
+        )
+        for group in diet.FOOD_GROUPS
+    ]
+
+def posture_section(posture_ids):
+    reports = posture.get_posture_reports(posture_ids)
+    return 'Posture', [
+        (posture_id.replace('-', ' ').capitalize(), reports.get(posture_id) or 'No report is available for this posture yet.')
+        for posture_id in posture_ids
+    ]
+
+def report_sections(request):
+    """[(heading, [(label or None, text), ...])] for the sections present in `request`.
+
+    Sections read from different tables, so they are built concurrently under one
+    fanout deadline; a report takes about as long as its slowest section.
+    """
+    calls = []
+    if request.get('recovery'):
+        calls.append((recovery_section, request['recovery']))
+    if request.get('diet'):
+        calls.append((diet_section, request['diet']))
+    if request.get('postureIds'):
+        # Its per-ID queries run on the same pool, which has more workers than there are sections
+        calls.append((posture_section, request['postureIds']))
+    return fanout.gather(calls)
+
+def _section_error(request):
+    if request.get('recovery') and recovery_report.read_metrics(request['recovery']) is None:
+        return 'recovery must be an object of numeric sleep, workoutRecovery and relaxation scores'
+    if request.get('diet'):
+        invalid = diet.validation_error(request['diet'])
+        if invalid:
+            return f"diet: {invalid}"
+    posture_ids = request.get('postureIds')
+    if posture_ids:
+        if not isinstance(posture_ids, list) or not all(isinstance(p, str) and p for p in posture_ids):
+            return 'postureIds must be a list of posture IDs'
+        if len(posture_ids) > MAX_POSTURE_IDS:
+            return f"At most {MAX_POSTURE_IDS} postureIds per report"
+    return None
+
+def validation_error(request):
+    """Return a 400 response if `request` is malformed or asks for no section, else None."""
+    if not isinstance(request, dict):
+        return json_response(400, {'error': 'Expected a JSON object'})
+    if not any(request.get(section) for section in SECTIONS):
+        return json_response(400, {'error': 'Provide at least one of recovery, diet or postureIds'})
+    invalid = _section_error(request)
+    if invalid:
+        return json_response(400, {'error': invalid})
+    return None
+
+def upload_report(buffer, extension, content_type, key=None):
+    """Upload a rendered report to REPORTS_BUCKET and return (key, presigned GET URL)."""
+    key = key or f"reports/{datetime.utcnow():%Y/%m/%d}/{uuid.uuid4().hex}.{extension}"
+    buffer.seek(0)
+    s3 = aws_clients.get_client('s3')
+    s3.upload_fileobj(buffer, REPORTS_BUCKET, key, ExtraArgs={'ContentType': content_type})
+    url = s3.generate_presigned_url(
+        'get_object', Params={'Bucket': REPORTS_BUCKET, 'Key': key}, ExpiresIn=PRESIGNED_URL_SECONDS
+    )
+    return key, url
+
+def deliver(request, buffer, extension, headers):
+    """Return the report inline (base64) or, if requested or too large, via S3 and a presigned URL."""
+    size = len(buffer.getbuffer())
+    if request.get('delivery') == 's3' or size > MAX_INLINE_BYTES:
+        key, url = upload_report(buffer, extension, headers['Content-Type'])
+        return json_response(200, {'key': key, 'url': url, 'expiresIn': PRESIGNED_URL_SECONDS})
+
+    response = raw_response(200, base64.b64encode(buffer.getvalue()).decode('ascii'), headers)
+    response['isBase64Encoded'] = True
+    return response